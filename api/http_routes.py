@@ -1,118 +1,231 @@
-import os
-import io
-import json
+import asyncio
 import random
+import re
 import logging
+from collections import deque
+from functools import lru_cache
 from typing import Optional
 
+import jinja2
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
 from fastapi import APIRouter, Request, Form, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from genai_processors import streams, processor, content_api
+from genai_processors import streams
 from genai_processors.content_api import ProcessorPart
 
 import db_logic
 from db_logic import (
     save_challenge,
     get_challenge,
-    save_submission,
+    enqueue_submission,
     get_game_state,
     update_game_state,
     Challenge,
     Submission,
-    PyObjectId,
 )
 import context
 from api.models import (
     ChallengeResponse,
     SubmissionResponse,
 )
+from api.responses import ORJSONResponse
+from processors.json_parts import json_part, raw_json_part, read_text
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-templates = Jinja2Templates(directory="templates")
+_rng = random.Random()
+
+AUDIO_QUEUE_SIZE = 16
+# The game state rides in the session cookie, so lists that grow with play are
+# capped to their most recent entries.
+MAX_STATE_HISTORY = 10
+GAME_MODES = ("story", "translation", "sakwe", "image")
+# For each mode, the modes a player can be switched to when they unlock a new one.
+NEXT_GAME_MODES = {mode: tuple(m for m in GAME_MODES if m != mode) for mode in GAME_MODES}
+# Responses whose shape is fixed are kept as pre-serialized bytes; only the
+# variable fields are encoded per request.
+_GUSAKUZA_INIT_TMPL = (
+    b'{"challenge_id":"gusakuza_init","source_text":%b,"context":%b,'
+    b'"challenge_type":"gusakuza_init","error_message":null}'
+)
+# Used when a Sakwe target does not split into a riddle and its answer; matches
+# the generator's static riddle.
+_FALLBACK_RIDDLE = ("Igisakuzo", "Some Answer")
+# Matches from the start of the buffer, so checking for a JSON object copies nothing.
+_JSON_OBJECT_START = re.compile(rb"[ \t\n\r]*\{")
+_GAME_PROCESSOR_UNAVAILABLE = b'{"detail":"Game processor not available."}'
+# The get_challenge payload has a fixed key set, so the state is serialized
+# straight to JSON and slotted into a template instead of being dumped to a dict.
+_GET_CHALLENGE_TMPL = b'{"action":"get_challenge","difficulty":%d,"state":%b,"game_mode":%b}'
+# Templates never change while the server runs, so skip Jinja's per-render
+# mtime check and keep every compiled template in memory.
+templates = Jinja2Templates(
+    env=jinja2.Environment(
+        loader=jinja2.FileSystemLoader("templates"),
+        autoescape=True,
+        auto_reload=False,
+        cache_size=-1,
+    )
+)
+
+
+class _AudioBuffer:
+    """A bounded single-producer/single-consumer hand-off for audio frames.
+
+    One reader task puts and one generator gets, so a deque and two events are
+    enough; unlike asyncio.Queue, nothing is locked or allocated per frame
+    unless a side actually has to wait.
+    """
+
+    def __init__(self, capacity: int):
+        self._frames: deque[bytes | None] = deque()
+        self._capacity = capacity
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+
+    async def put(self, frame: bytes):
+        while len(self._frames) >= self._capacity:
+            self._space.clear()
+            await self._space.wait()
+        self._frames.append(frame)
+        self._ready.set()
+
+    async def get(self) -> bytes | None:
+        while not self._frames:
+            self._ready.clear()
+            await self._ready.wait()
+        frame = self._frames.popleft()
+        self._space.set()
+        return frame
+
+    def close(self):
+        """Ends the stream. Never waits, so it is safe from a finally block."""
+        self._frames.append(None)
+        self._ready.set()
 
 
 @router.get("/favicon.ico", include_in_schema=False)
 async def favicon():
-    return Response(status_code=204)
+    # There is no icon; let browsers remember that instead of asking on every page load.
+    return Response(status_code=204, headers={"Cache-Control": "public, max-age=604800"})
+
+
+@lru_cache(maxsize=512)
+def _render_home(score: int, lives: int, game_mode: str, dev_mode: bool, audio_features_enabled: bool) -> bytes:
+    """Renders the home page to UTF-8. Only these few values vary, so renders are memoized."""
+    return templates.get_template("index.html").render(
+        total_score=score,
+        lives=lives,
+        score=score,
+        dev_mode=dev_mode,
+        audio_features_enabled=audio_features_enabled,
+        game_mode=game_mode,
+    ).encode("utf-8")
 
 
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     current_state = await get_game_state(request.session)
     audio_features_enabled = context.tts_processor is not None and context.stt_processor is not None
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "total_score": current_state.score,
-            "lives": current_state.lives,
-            "score": current_state.score,
-            "dev_mode": db_logic.DEV_MODE,
-            "audio_features_enabled": audio_features_enabled,
-            "game_mode": current_state.game_mode,
-        },
+    return HTMLResponse(
+        _render_home(
+            current_state.score,
+            current_state.lives,
+            current_state.game_mode,
+            db_logic.DEV_MODE,
+            audio_features_enabled,
+        )
     )
 
 
+def _fallback_image_challenge() -> dict:
+    """Picks a sample image for when image generation fails, from the images the generator already loaded."""
+    fallback_images = context.challenge_generator.image_files if context.challenge_generator else ()
+    if not fallback_images:
+        return {"error_message": "Image generation failed and no fallback images are available."}
+    logger.warning("Image generation failed, using fallback image.")
+    return {
+        "challenge_type": "image_description",
+        "source_text": f"/static/sampleimg/{_rng.choice(fallback_images)}",
+        "target_text": "Describe the image.",
+        "context": "Image Description",
+    }
+
+
 @router.get("/get_challenge", response_model=ChallengeResponse)
 async def get_challenge_endpoint(request: Request, difficulty: int = None, game_mode: str = None):
-    if not context.game_processor:
-        raise HTTPException(status_code=503, detail="Game processor not available.")
+    game_processor = context.game_processor
+    if not game_processor:
+        return Response(_GAME_PROCESSOR_UNAVAILABLE, status_code=503, media_type="application/json")
 
-    current_state = await get_game_state(request.session)
+    session = request.session
+    current_state = await get_game_state(session)
     game_mode = game_mode or current_state.game_mode or "story"
     current_state.game_mode = game_mode
     difficulty = difficulty or current_state.difficulty
 
-    input_data = {
-        "action": "get_challenge",
-        "difficulty": difficulty,
-        "state": json.loads(current_state.model_dump_json(by_alias=True)),
-        "game_mode": game_mode,
-    }
-    input_json = json.dumps(input_data)
-    input_stream = streams.stream_content([ProcessorPart(input_json)])
+    payload = _GET_CHALLENGE_TMPL % (
+        difficulty,
+        current_state.__pydantic_serializer__.to_json(current_state, by_alias=True),
+        orjson.dumps(game_mode),
+    )
+    input_stream = streams.stream_content([raw_json_part(payload)])
+    response_json = await read_text(game_processor(input_stream))
 
-    response_json = ""
-    async for part in context.game_processor(input_stream):
-        if part.text:
-            response_json += part.text
-    
-    try:
-        # The response is now a dictionary containing both the challenge and the updated state
-        result_data = json.loads(response_json)
-        challenge_data = result_data.get("challenge", {})
-        updated_state_data = result_data.get("state")
-
-        # Update the session with the new state returned by the processor
-        if updated_state_data:
-            current_state = db_logic.GameState(**updated_state_data)
-            await update_game_state(request.session, current_state)
-
-    except (json.JSONDecodeError, KeyError):
-        # Fallback for image generation failure
-        if game_mode == "image":
-            logger.warning("Image generation failed, using fallback image.")
-            fallback_image = random.choice(os.listdir("static/sampleimg"))
-            challenge_data = {
-                "challenge_type": "image_description",
-                "source_text": f"/static/sampleimg/{fallback_image}",
-                "target_text": "Describe the image.",
-                "context": "Image Description",
-            }
-        else:
+    state_changed = False
+    challenge_data = None
+    # A degraded processor reply is plain text; skip the parse attempt outright.
+    if _JSON_OBJECT_START.match(response_json):
+        try:
+            # The response is now a dictionary containing both the challenge and the updated state
+            result_data = orjson.loads(response_json)
+            challenge_data = result_data.get("challenge", {})
+            updated_state_data = result_data.get("state")
+
+            # Adopt the new state returned by the processor; it is saved to the session below.
+            if updated_state_data:
+                current_state = db_logic.GameState.model_validate(updated_state_data)
+                state_changed = True
+        except (orjson.JSONDecodeError, KeyError):
+            challenge_data = None
+
+    if challenge_data is None:
+        if game_mode != "image":
             raise HTTPException(status_code=500, detail="Failed to decode response from game processor.")
+        challenge_data = _fallback_image_challenge()
+
+    # Handle the 'sakwe' game mode initialization
+    is_riddle_init = (
+        "error_message" not in challenge_data and challenge_data.get("challenge_type") == "gusakuza_init"
+    )
+    if is_riddle_init:
+        target_text = challenge_data.get("target_text") or ""
+        parts = target_text.split("|", 1)
+        if len(parts) == 2:
+            current_state.pending_riddle_parsed = (parts[0].strip(), parts[1].strip())
+        else:
+            logger.warning("Malformed riddle target %r, using the static riddle.", target_text)
+            current_state.pending_riddle_parsed = _FALLBACK_RIDDLE
+
+    # A single session write covers both the processor's state and a pending riddle.
+    if state_changed or is_riddle_init:
+        await update_game_state(session, current_state)
 
     if "error_message" in challenge_data:
         raise HTTPException(status_code=503, detail=challenge_data["error_message"])
 
-    # Handle the 'sakwe' game mode initialization
-    if challenge_data.get("challenge_type") == "gusakuza_init":
-        current_state.pending_riddle = challenge_data["target_text"]
-        await update_game_state(request.session, current_state)
-        return ChallengeResponse(challenge_id="gusakuza_init", **challenge_data)
+    if is_riddle_init:
+        return Response(
+            _GUSAKUZA_INIT_TMPL % (
+                orjson.dumps(challenge_data["source_text"]),
+                orjson.dumps(challenge_data.get("context")),
+            ),
+            media_type="application/json",
+        )
 
     # Save the challenge to the database
     challenge = Challenge(**challenge_data, difficulty=difficulty)
@@ -121,37 +234,40 @@ async def get_challenge_endpoint(request: Request, difficulty: int = None, game_
     # The game state is already updated, so we don't need to call update_game_state again
     # unless there are other changes to be made here.
 
-    return ChallengeResponse(
-        challenge_id=str(challenge_id),
-        source_text=challenge.source_text,
-        context=challenge.context,
-        challenge_type=challenge.challenge_type,
-    )
+    return ORJSONResponse({
+        "challenge_id": str(challenge_id),
+        "source_text": challenge.source_text,
+        "context": challenge.context,
+        "challenge_type": challenge.challenge_type,
+        "error_message": None,
+    })
 
 
 @router.post("/soma", response_model=ChallengeResponse)
 async def soma_endpoint(request: Request):
-    current_state = await get_game_state(request.session)
-    if not current_state.pending_riddle:
+    session = request.session
+    current_state = await get_game_state(session)
+    if not current_state.pending_riddle_parsed:
         raise HTTPException(status_code=400, detail="No pending riddle.")
 
-    riddle, answer = current_state.pending_riddle.split("|")
+    riddle, answer = current_state.pending_riddle_parsed
     challenge = Challenge(
         challenge_type="gusakuza",
-        source_text=riddle.strip(),
-        target_text=answer.strip(),
+        source_text=riddle,
+        target_text=answer,
         difficulty=1,
         context="Igisakuzo",
     )
     challenge_id = await save_challenge(challenge)
-    current_state.pending_riddle = None
-    await update_game_state(request.session, current_state)
-    return ChallengeResponse(
-        challenge_id=str(challenge_id),
-        source_text=challenge.source_text,
-        context=challenge.context,
-        challenge_type=challenge.challenge_type,
-    )
+    current_state.pending_riddle_parsed = None
+    await update_game_state(session, current_state)
+    return ORJSONResponse({
+        "challenge_id": str(challenge_id),
+        "source_text": challenge.source_text,
+        "context": challenge.context,
+        "challenge_type": challenge.challenge_type,
+        "error_message": None,
+    })
 
 
 @router.get("/get_hint", response_model=dict)
@@ -160,24 +276,25 @@ async def get_hint_endpoint(request: Request, challenge_id: str):
     if not challenge:
         raise HTTPException(status_code=404, detail="Challenge not found.")
 
-    if not context.game_processor:
-        raise HTTPException(status_code=503, detail="Game processor not available.")
+    game_processor = context.game_processor
+    if not game_processor:
+        return Response(_GAME_PROCESSOR_UNAVAILABLE, status_code=503, media_type="application/json")
 
     current_state = await get_game_state(request.session)
     story_context = ""
     if current_state.story:
         try:
-            story_data = json.loads(current_state.story)
+            story_data = orjson.loads(current_state.story)
             # Use the current chapter, but don't advance it
             story_context = story_data["chapters"][current_state.story_chapter]
-        except (json.JSONDecodeError, IndexError):
+        except (orjson.JSONDecodeError, IndexError):
             pass
 
     # The riddle is the source_text, and the answer is the target_text
     riddle = challenge.source_text
     answer = challenge.target_text
 
-    hint_data = await context.game_processor.challenge_generator.generate_hint(riddle, answer, story_context)
+    hint_data = await game_processor.challenge_generator.generate_hint(riddle, answer, story_context)
     return hint_data
 
 
@@ -185,31 +302,36 @@ async def get_hint_endpoint(request: Request, challenge_id: str):
 async def submit_answer_endpoint(
     request: Request, challenge_id: str = Form(...), user_answer: str = Form(...)
 ):
-    challenge = await get_challenge(challenge_id)
+    game_processor = context.game_processor
+    if not game_processor:
+        return Response(_GAME_PROCESSOR_UNAVAILABLE, status_code=503, media_type="application/json")
+
+    try:
+        challenge_object_id = ObjectId(challenge_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid challenge ID.")
+
+    session = request.session
+    challenge, current_state = await asyncio.gather(
+        get_challenge(challenge_id), get_game_state(session)
+    )
     if not challenge:
         raise HTTPException(status_code=404, detail="Challenge not found.")
 
-    current_state = await get_game_state(request.session)
-    
     input_data = {
         "action": "evaluate_answer",
         "user_answer": user_answer,
         "target_text": challenge.target_text,
         "challenge_type": challenge.challenge_type,
     }
-    input_json = json.dumps(input_data)
-    input_stream = streams.stream_content([ProcessorPart(input_json)])
+    input_stream = streams.stream_content([json_part(input_data)])
+    response_json = await read_text(game_processor(input_stream))
 
-    response_json = ""
-    async for part in context.game_processor(input_stream):
-        if part.text:
-            response_json += part.text
-    
     try:
-        eval_data = json.loads(response_json)
+        eval_data = orjson.loads(response_json)
         is_correct = eval_data.get("is_correct", False)
         message = eval_data.get("feedback", "Could not get feedback.")
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         is_correct = False
         message = "Error evaluating your answer."
 
@@ -217,10 +339,11 @@ async def submit_answer_endpoint(
         current_state.score += 10
         if challenge.challenge_type == "gusakuza":
             current_state.thematic_words.append(challenge.target_text)
+            del current_state.thematic_words[:-MAX_STATE_HISTORY]
         if current_state.score > 0 and current_state.score % 50 == 0 and not current_state.life_lost:
-            game_modes = ["story", "translation", "sakwe", "image"]
-            game_modes.remove(current_state.game_mode)
-            current_state.game_mode = random.choice(game_modes)
+            current_state.game_mode = _rng.choice(
+                NEXT_GAME_MODES.get(current_state.game_mode, GAME_MODES)
+            )
             current_state.difficulty = min(3, current_state.difficulty + 1)
             message += f" You've unlocked a new game mode: {current_state.game_mode.capitalize()}! Difficulty increased."
     else:
@@ -228,13 +351,11 @@ async def submit_answer_endpoint(
         current_state.life_lost = True
 
     score_awarded = 10 if is_correct else 0
-    await save_submission(
-        Submission(
-            challenge_id=PyObjectId(challenge_id),
-            user_answer=user_answer,
-            is_correct=is_correct,
-            score=score_awarded,
-        )
+    submission = Submission(
+        challenge_id=challenge_object_id,
+        user_answer=user_answer,
+        is_correct=is_correct,
+        score=score_awarded,
     )
 
     if current_state.lives <= 0:
@@ -243,57 +364,88 @@ async def submit_answer_endpoint(
         current_state.score = 0
         current_state.life_lost = False
 
-    await update_game_state(request.session, current_state)
+    # The submission record is written in the background; nothing below reads it.
+    enqueue_submission(submission)
+    await update_game_state(session, current_state)
 
-    return SubmissionResponse(
-        message=message,
-        is_correct=is_correct,
-        correct_answer="", # This is now part of the feedback message
-        score_awarded=score_awarded,
-        new_total_score=current_state.score,
-        lives=current_state.lives,
-        score=current_state.score,
-    )
+    return ORJSONResponse({
+        "message": message,
+        "is_correct": is_correct,
+        "correct_answer": "", # This is now part of the feedback message
+        "score_awarded": score_awarded,
+        "new_total_score": current_state.score,
+        "lives": current_state.lives,
+        "score": current_state.score,
+    })
 
 
 @router.websocket("/ws/transcribe")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     
-    if not context.stt_processor:
+    stt_processor = context.stt_processor
+    if not stt_processor:
         await websocket.close(code=1011, reason="Speech-to-text service not available.")
         return
 
+    # Drain the socket in its own task so a slow model never stalls receives;
+    # the bounded buffer pushes back on the client once the model falls behind.
+    audio_queue = _AudioBuffer(AUDIO_QUEUE_SIZE)
+
+    async def read_audio():
+        try:
+            while True:
+                await audio_queue.put(await websocket.receive_bytes())
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.error("Error reading transcription audio: %s", e)
+        finally:
+            # However reading stops, the generator below must see the end of the stream.
+            audio_queue.close()
+
     async def audio_stream_generator():
-        while True:
-            try:
-                data = await websocket.receive_bytes()
-                yield ProcessorPart(audio=data)
-            except WebSocketDisconnect:
-                break
+        while (data := await audio_queue.get()) is not None:
+            yield ProcessorPart(audio=data)
 
+    reader = asyncio.create_task(read_audio())
     try:
-        response_stream = context.stt_processor(audio_stream_generator())
+        response_stream = stt_processor(audio_stream_generator())
         async for part in response_stream:
             if part.text:
                 await websocket.send_text(part.text)
     except Exception as e:
-        logger.error(f"Error during transcription: {e}")
+        logger.error("Error during transcription: %s", e)
     finally:
+        reader.cancel()
         await websocket.close()
 
 
 @router.post("/synthesize")
 async def synthesize_speech(text: str = Form(...)):
-    if not context.tts_processor:
+    tts_processor = context.tts_processor
+    if not tts_processor:
         raise HTTPException(
             status_code=503, detail="Text-to-speech service not available."
         )
+
+    async def synthesized_audio():
+        async for part in tts_processor(streams.stream_content([ProcessorPart(text)])):
+            if part.audio:
+                yield part.audio
+
+    # Pull the first chunk before the response starts so early failures are still a 500;
+    # the rest is streamed to the client as the processor produces it.
+    audio_chunks = synthesized_audio()
     try:
-        result_parts = await processor.apply_async(
-            context.tts_processor, [content_api.ProcessorPart(text)]
-        )
-        audio_data = b"".join(part.audio for part in result_parts if part.audio)
-        return StreamingResponse(io.BytesIO(audio_data), media_type="audio/mpeg")
+        first_chunk = await anext(audio_chunks, b"")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to synthesize speech.")
+
+    async def stream_audio():
+        # One write per processor part, so playback keeps pace with synthesis.
+        yield first_chunk
+        async for chunk in audio_chunks:
+            yield chunk
+
+    return StreamingResponse(stream_audio(), media_type="audio/mpeg")
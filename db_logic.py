@@ -2,12 +2,16 @@
 import os
 from dotenv import load_dotenv
 import motor.motor_asyncio
+from pymongo.errors import BulkWriteError, PyMongoError
 from pydantic import BaseModel, Field
 from typing import Optional, Any
 from bson import ObjectId
 import logging
-import json
+import orjson
 import asyncio
+from lru import LRUCache
+from datetime import datetime, timezone
+from functools import partial
 
 # --- Development Mode Configuration ---
 DEV_MODE = False
@@ -21,6 +25,17 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "language_app") # Default name if not set
+# Connection pool settings; a warm pool keeps connection setup off the request path.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "200"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "20"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+# How long a request may wait for a pooled connection before failing, so a
+# spike queues briefly instead of piling up behind an exhausted pool.
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+# How long an operation waits for a reachable server before failing, instead
+# of the driver's 30s default.
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000"))
 
 if not MONGODB_URI and not DEV_MODE:
     logger.error("MONGODB_URI not found in environment variables.")
@@ -30,11 +45,38 @@ if not MONGODB_URI and not DEV_MODE:
 client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
 db: Optional[motor.motor_asyncio.AsyncIOMotorDatabase] = None
 
-def init_app_mode(dev_mode: bool):
+
+class _UnavailableCollection:
+    """Stands in for a collection until MongoDB is connected, failing like get_database()."""
+
+    def __getattr__(self, name):
+        logger.error("Database instance is not available. Connection might have failed.")
+        raise RuntimeError("Database not initialized. Check MongoDB connection.")
+
+
+# Collections are resolved once on connect rather than looked up on every operation.
+challenges_collection: Any = _UnavailableCollection()
+submissions_collection: Any = _UnavailableCollection()
+feedback_collection: Any = _UnavailableCollection()
+
+def _bind_collections(database: Optional[motor.motor_asyncio.AsyncIOMotorDatabase]):
+    global challenges_collection, submissions_collection, feedback_collection
+    if database is None:
+        challenges_collection = submissions_collection = feedback_collection = _UnavailableCollection()
+        return
+    challenges_collection = database["challenges"]
+    submissions_collection = database["submissions"]
+    feedback_collection = database["feedback"]
+
+def init_app_mode(dev_mode: bool, workers: int = 1):
     """Initializes the application mode (dev or production)."""
     global DEV_MODE
     DEV_MODE = dev_mode
     if DEV_MODE:
+        # Each worker would cache its own copy of the dev database and overwrite
+        # the others' changes to the one file.
+        if workers > 1:
+            raise ValueError(f"DEV_MODE supports a single worker, but {workers} were requested; unset WEB_CONCURRENCY.")
         logger.info("Application starting in DEVELOPMENT mode.")
         _init_dev_db()
     else:
@@ -43,8 +85,8 @@ def init_app_mode(dev_mode: bool):
 def _init_dev_db():
     """Initializes the development database if it doesn't exist."""
     if not os.path.exists(DEV_DB_FILE):
-        with open(DEV_DB_FILE, "w") as f:
-            json.dump({
+        with open(DEV_DB_FILE, "wb") as f:
+            f.write(_encode_dev_db({
                 "challenges": [],
                 "submissions": [],
                 "game_state": [{
@@ -53,15 +95,16 @@ def _init_dev_db():
                     "lives": 3,
                     "score": 0,
                     "incorrect_answers": [],
-                    "pending_riddle": None,
+                    "pending_riddle_parsed": None,
                     "game_mode": "story",
                     "thematic_words": [],
                     "story": None,
                     "story_chapter": 0,
                     "life_lost": False
                 }]
-            }, f, indent=4)
+            }))
         logger.info(f"Initialized development database at {DEV_DB_FILE}")
+    _load_dev_db()
 
 async def connect_to_mongo():
     """Connects to MongoDB."""
@@ -70,7 +113,16 @@ async def connect_to_mongo():
     global client, db
     logger.info("Connecting to MongoDB...")
     try:
-        client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+        client = motor.motor_asyncio.AsyncIOMotorClient(
+            MONGODB_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            retryWrites=True,
+            compressors=MONGO_COMPRESSORS,
+        )
         db = client[DATABASE_NAME]
         await client.admin.command('ping')
         logger.info("Successfully connected to MongoDB.")
@@ -78,6 +130,20 @@ async def connect_to_mongo():
         logger.error(f"Failed to connect to MongoDB: {e}")
         client = None
         db = None
+        _bind_collections(None)
+        return
+    _bind_collections(db)
+    try:
+        await _ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Could not create MongoDB indexes: {e}")
+
+async def _ensure_indexes():
+    """Creates the indexes the lookups by challenge ID rely on. Idempotent."""
+    await asyncio.gather(
+        submissions_collection.create_index("challenge_id"),
+        feedback_collection.create_index("challenge_id"),
+    )
 
 async def close_mongo_connection():
     """Closes the MongoDB connection."""
@@ -106,7 +172,10 @@ class PyObjectId(ObjectId):
 
     @classmethod
     def validate(cls, v, field):
-        if isinstance(v, (str, ObjectId)):
+        # Documents read from Mongo already carry ObjectIds; pass them through.
+        if isinstance(v, ObjectId):
+            return v
+        if isinstance(v, str):
             if not ObjectId.is_valid(v):
                 raise ValueError("Invalid ObjectId")
             return ObjectId(v)
@@ -137,7 +206,8 @@ class GameState(BaseModel):
     lives: int = 3
     score: int = 0
     incorrect_answers: list[str] = []
-    pending_riddle: Optional[str] = None
+    # (riddle, answer) of the Sakwe riddle waiting for "soma", split when it is set.
+    pending_riddle_parsed: Optional[tuple[str, str]] = None
     game_mode: str = "story"
     thematic_words: list[str] = []
     story: Optional[str] = None
@@ -163,52 +233,110 @@ class Submission(BaseModel):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+# Serializers bound once per model, so the dump options are not re-parsed on
+# every call.
+_dump_challenge = partial(Challenge.__pydantic_serializer__.to_python, by_alias=True, exclude_none=True)
+_dump_submission = partial(Submission.__pydantic_serializer__.to_python, by_alias=True, exclude_none=True)
+_dump_game_state = partial(GameState.__pydantic_serializer__.to_python, by_alias=True)
+
+def _utcnow() -> datetime:
+    """Returns the current time as a timezone-aware UTC datetime."""
+    return datetime.now(timezone.utc)
+
 # --- Dev Mode Database Operations ---
 
+# The dev database is loaded into memory once and every operation works on that
+# copy. Writes only mark it dirty; a background task flushes it to disk,
+# coalescing bursts of writes into one atomic file replace.
+DEV_DB_FLUSH_DELAY = 0.2
+
+_dev_cache: Optional[dict] = None
+_dev_dirty: Optional[asyncio.Event] = None
+_dev_flusher: Optional[asyncio.Task] = None
+# Set by stop_background_writers() to ask the flusher to exit after a final flush.
+_dev_stopping = False
+
+def _load_dev_db():
+    global _dev_cache
+    with open(DEV_DB_FILE, "rb") as f:
+        _dev_cache = orjson.loads(f.read())
+
 def _read_dev_db():
-    with open(DEV_DB_FILE, "r") as f:
-        return json.load(f)
+    if _dev_cache is None:
+        _load_dev_db()
+    return _dev_cache
 
 def _write_dev_db(data):
-    with open(DEV_DB_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    global _dev_cache
+    _dev_cache = data
+    if _dev_dirty is None:
+        # No flusher is running (e.g. outside the app lifespan); write through.
+        _write_dev_db_file(_encode_dev_db(data))
+        return
+    _dev_dirty.set()
+
+def _encode_dev_db(data: dict) -> bytes:
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2, default=str)
+
+def _write_dev_db_file(contents: bytes):
+    tmp_file = f"{DEV_DB_FILE}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(contents)
+    os.replace(tmp_file, DEV_DB_FILE)
+
+async def _flush_dev_db():
+    # Serialize on the loop so the snapshot is consistent; only the disk I/O is
+    # handed to a thread.
+    contents = _encode_dev_db(_dev_cache)
+    await asyncio.to_thread(_write_dev_db_file, contents)
+
+async def _flush_dev_db_forever():
+    # Never cancelled, since a cancelled to_thread write keeps running; it exits
+    # on _dev_stopping once nothing is left to flush.
+    while True:
+        await _dev_dirty.wait()
+        if not _dev_stopping:
+            await asyncio.sleep(DEV_DB_FLUSH_DELAY)
+        _dev_dirty.clear()
+        try:
+            await _flush_dev_db()
+        except Exception as e:
+            logger.error("Failed to write development database: %s", e)
+        if _dev_stopping and not _dev_dirty.is_set():
+            return
 
 async def save_challenge_dev(challenge_data: Challenge) -> ObjectId:
-    await asyncio.sleep(0.01) # Simulate async
     db_data = _read_dev_db()
-    challenge_dict = challenge_data.model_dump(by_alias=True, exclude_none=True)
+    challenge_dict = _dump_challenge(challenge_data)
     new_id = ObjectId()
     challenge_dict["_id"] = {"$oid": str(new_id)}
     db_data["challenges"].append(challenge_dict)
     _write_dev_db(db_data)
-    logger.info(f"Saved challenge with ID: {new_id} in dev db")
+    logger.debug("Saved challenge with ID: %s in dev db", new_id)
     return new_id
 
 async def get_challenge_dev(challenge_id: str) -> Optional[Challenge]:
-    await asyncio.sleep(0.01) # Simulate async
     db_data = _read_dev_db()
     for challenge in db_data["challenges"]:
         if challenge["_id"]["$oid"] == challenge_id:
             # Pydantic model expects `_id` at the top level, not inside a dict
             challenge_data = challenge.copy()
             challenge_data["_id"] = challenge_data["_id"]["$oid"]
-            return Challenge(**challenge_data)
-    logger.warning(f"Challenge not found with ID: {challenge_id} in dev db")
+            return Challenge.model_validate(challenge_data)
+    logger.warning("Challenge not found with ID: %s in dev db", challenge_id)
     return None
 
 async def save_submission_dev(submission_data: Submission) -> ObjectId:
-    await asyncio.sleep(0.01) # Simulate async
     db_data = _read_dev_db()
-    submission_dict = submission_data.model_dump(by_alias=True, exclude_none=True)
+    submission_dict = _dump_submission(submission_data)
     new_id = ObjectId()
     submission_dict["_id"] = {"$oid": str(new_id)}
-    from datetime import datetime
-    submission_dict["submitted_at"] = datetime.utcnow().isoformat()
+    submission_dict["submitted_at"] = _utcnow().isoformat()
     # Ensure challenge_id is a string for JSON serialization
     submission_dict["challenge_id"] = str(submission_data.challenge_id)
     db_data["submissions"].append(submission_dict)
     _write_dev_db(db_data)
-    logger.info(f"Saved submission with ID: {new_id} for challenge ID: {submission_data.challenge_id} in dev db")
+    logger.debug("Saved submission with ID: %s for challenge ID: %s in dev db", new_id, submission_data.challenge_id)
     return new_id
 
 
@@ -216,63 +344,202 @@ async def save_submission_dev(submission_data: Submission) -> ObjectId:
 async def get_game_state(session: dict) -> GameState:
     """Retrieves the current game state from the session, creating it if it doesn't exist."""
     if "game_state" not in session:
-        logger.info("No game state found in session, creating a default one.")
-        session["game_state"] = GameState().model_dump(by_alias=True)
+        logger.debug("No game state found in session, creating a default one.")
+        session["game_state"] = _dump_game_state(GameState())
     
     # Ensure the loaded state is a GameState object
     state_data = session["game_state"]
     if isinstance(state_data, dict):
-        return GameState(**state_data)
+        return GameState.model_validate(state_data)
     return state_data
 
 async def update_game_state(session: dict, state: GameState):
     """Updates the game state in the session."""
-    session["game_state"] = state.model_dump(by_alias=True)
-    logger.info(f"Updated game state in session: Lives={state.lives}, Score={state.score}")
+    session["game_state"] = _dump_game_state(state)
+    logger.debug("Updated game state in session: Lives=%s, Score=%s", state.lives, state.score)
 
 
 # --- Unified Database Operations ---
 
+# --- Challenge Cache ---
+# Challenges are never modified once saved, so lookups (e.g. the one in every
+# answer submission) can be served from memory.
+CHALLENGE_CACHE_SIZE = 4096
+_challenge_cache: LRUCache[str, Challenge] = LRUCache(CHALLENGE_CACHE_SIZE)
+
 async def save_challenge(challenge_data: Challenge) -> ObjectId:
     """Saves a new challenge to the database."""
     if DEV_MODE:
-        return await save_challenge_dev(challenge_data)
-    database = get_database()
-    challenge_dict = challenge_data.model_dump(by_alias=True, exclude_none=True)
-    result = await database["challenges"].insert_one(challenge_dict)
-    logger.info(f"Saved challenge with ID: {result.inserted_id}")
-    return result.inserted_id
+        challenge_id = await save_challenge_dev(challenge_data)
+    else:
+        challenge_dict = _dump_challenge(challenge_data)
+        result = await challenges_collection.insert_one(challenge_dict)
+        logger.debug("Saved challenge with ID: %s", result.inserted_id)
+        challenge_id = result.inserted_id
+    _challenge_cache.put(str(challenge_id), challenge_data.model_copy(update={"id": challenge_id}))
+    return challenge_id
 
 async def get_challenge(challenge_id: str) -> Optional[Challenge]:
-    """Retrieves a challenge by its ID."""
+    """Retrieves a challenge by its ID, serving repeat lookups from memory."""
+    challenge = _challenge_cache.get(challenge_id)
+    if challenge is not None:
+        return challenge
+    challenge = await _fetch_challenge(challenge_id)
+    if challenge is not None:
+        _challenge_cache.put(challenge_id, challenge)
+    return challenge
+
+async def _fetch_challenge(challenge_id: str) -> Optional[Challenge]:
     if DEV_MODE:
         return await get_challenge_dev(challenge_id)
-    database = get_database()
     try:
         obj_id = ObjectId(challenge_id)
     except Exception:
-        logger.error(f"Invalid challenge ID format: {challenge_id}")
+        logger.error("Invalid challenge ID format: %s", challenge_id)
         return None
-    challenge_data = await database["challenges"].find_one({"_id": obj_id})
+    challenge_data = await challenges_collection.find_one({"_id": obj_id})
     if challenge_data:
-        return Challenge(**challenge_data)
-    logger.warning(f"Challenge not found with ID: {challenge_id}")
+        return Challenge.model_validate(challenge_data)
+    logger.warning("Challenge not found with ID: %s", challenge_id)
     return None
 
+def _as_object_id(value: ObjectId | str) -> ObjectId:
+    """Parses string IDs; ObjectIds (including PyObjectId) pass through unparsed."""
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+# A failed batch is retried once, after a short pause, before it is dropped.
+SUBMISSION_WRITE_ATTEMPTS = 2
+SUBMISSION_RETRY_DELAY = 0.5
+DUPLICATE_KEY_ERROR = 11000
+
+def _submission_document(submission_data: Submission) -> dict:
+    """Builds the MongoDB document for a submission."""
+    submission_data.challenge_id = _as_object_id(submission_data.challenge_id)
+    submission_dict = _dump_submission(submission_data)
+    submission_dict["submitted_at"] = _utcnow()
+    return submission_dict
+
 async def save_submission(submission_data: Submission) -> ObjectId:
     """Saves a user's submission to the database."""
     if DEV_MODE:
         return await save_submission_dev(submission_data)
-    database = get_database()
-    if isinstance(submission_data.challenge_id, str):
-         submission_data.challenge_id = PyObjectId(submission_data.challenge_id)
-    submission_dict = submission_data.model_dump(by_alias=True, exclude_none=True)
-    from datetime import datetime
-    submission_dict["submitted_at"] = datetime.utcnow()
-    result = await database["submissions"].insert_one(submission_dict)
-    logger.info(f"Saved submission with ID: {result.inserted_id} for challenge ID: {submission_data.challenge_id}")
+    submission_dict = _submission_document(submission_data)
+    result = await submissions_collection.insert_one(submission_dict)
+    logger.debug("Saved submission with ID: %s for challenge ID: %s", result.inserted_id, submission_data.challenge_id)
     return result.inserted_id
 
+async def save_submissions(submissions: list[Submission]) -> list[ObjectId]:
+    """Saves a batch of submissions in a single round-trip, retrying once what did not make it in."""
+    if DEV_MODE:
+        return [await save_submission_dev(submission) for submission in submissions]
+    # The _ids are assigned here, so a retry cannot insert a submission twice.
+    documents = [_submission_document(submission) | {"_id": ObjectId()} for submission in submissions]
+    inserted_ids = [document["_id"] for document in documents]
+    for attempt in range(1, SUBMISSION_WRITE_ATTEMPTS + 1):
+        try:
+            # Unordered, so one bad document does not stop the rest of the batch.
+            await submissions_collection.insert_many(documents, ordered=False)
+            break
+        except BulkWriteError as e:
+            # Documents already saved by an earlier attempt come back as duplicates.
+            write_errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY_ERROR]
+            if not write_errors:
+                break
+            logger.warning(
+                "Saved %d of %d submissions (attempt %d); first error: %s",
+                e.details.get("nInserted", 0), len(documents), attempt, write_errors[0].get("errmsg"),
+            )
+            if attempt == SUBMISSION_WRITE_ATTEMPTS:
+                raise
+            documents = [documents[error["index"]] for error in write_errors]
+        except PyMongoError as e:
+            logger.warning("Failed to save %d submissions (attempt %d): %s", len(documents), attempt, e)
+            if attempt == SUBMISSION_WRITE_ATTEMPTS:
+                raise
+        await asyncio.sleep(SUBMISSION_RETRY_DELAY)
+    logger.debug("Saved a batch of %d submissions", len(inserted_ids))
+    return inserted_ids
+
+
+# --- Background Submission Writer ---
+# Submissions are never read back on the request path, so they are queued and
+# written in batches by a background task instead of one insert per answer.
+SUBMISSION_BATCH_SIZE = 64
+# How long the writer waits after the first queued submission so that
+# back-to-back answers land in the same insert_many.
+SUBMISSION_BATCH_WINDOW = 0.01
+
+_submission_queue: Optional[asyncio.Queue] = None
+_submission_writer: Optional[asyncio.Task] = None
+# Direct writes started while the writer is not running, kept referenced until done.
+_pending_writes: set[asyncio.Task] = set()
+
+def enqueue_submission(submission_data: Submission) -> None:
+    """Queues a submission for the background writer."""
+    if _submission_queue is None:
+        # The writer is not running (e.g. outside the app lifespan); write directly.
+        task = asyncio.get_running_loop().create_task(save_submission(submission_data))
+        _pending_writes.add(task)
+        task.add_done_callback(_finish_pending_write)
+        return
+    _submission_queue.put_nowait(submission_data)
+
+def _finish_pending_write(task: asyncio.Task):
+    _pending_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Failed to save a submission: %s", task.exception())
+
+def _drain_submission_queue() -> list[Submission]:
+    batch = []
+    while len(batch) < SUBMISSION_BATCH_SIZE and not _submission_queue.empty():
+        batch.append(_submission_queue.get_nowait())
+    return batch
+
+async def _write_submissions_forever():
+    # Runs until it dequeues the None that stop_background_writers() enqueues,
+    # so a batch already taken off the queue is never lost to cancellation.
+    running = True
+    while running:
+        batch = [await _submission_queue.get()]
+        await asyncio.sleep(SUBMISSION_BATCH_WINDOW)
+        batch.extend(_drain_submission_queue())
+        if None in batch:
+            running = False
+            batch = [submission for submission in batch if submission is not None]
+        if not batch:
+            continue
+        try:
+            await save_submissions(batch)
+        except Exception as e:
+            logger.error("Dropped unsaved submissions from a batch of %d: %s", len(batch), e)
+
+def start_background_writers():
+    """Starts the background database writers. Call from the app lifespan."""
+    global _submission_queue, _submission_writer, _dev_dirty, _dev_flusher, _dev_stopping
+    _submission_queue = asyncio.Queue()
+    _submission_writer = asyncio.create_task(_write_submissions_forever())
+    if DEV_MODE:
+        _dev_stopping = False
+        _dev_dirty = asyncio.Event()
+        _dev_flusher = asyncio.create_task(_flush_dev_db_forever())
+
+async def stop_background_writers():
+    """Stops the background writers, flushing anything still queued."""
+    global _submission_queue, _submission_writer, _dev_dirty, _dev_flusher, _dev_stopping
+    if _submission_writer is None:
+        return
+    _submission_queue.put_nowait(None)
+    await _submission_writer
+    _submission_queue = None
+    _submission_writer = None
+    if _dev_flusher is not None:
+        # Wake the flusher for one last flush and let it finish any write in progress.
+        _dev_stopping = True
+        _dev_dirty.set()
+        await _dev_flusher
+        _dev_dirty = None
+        _dev_flusher = None
+
 
 
 
@@ -284,13 +551,16 @@ async def get_recent_challenge_texts(limit: int = 20) -> list[str]:
     if DEV_MODE:
         # This is a simplified version for dev mode
         db_data = _read_dev_db()
-        challenges = db_data.get("challenges", [])
-        # Sort by a simulated timestamp or just take the last few
-        challenges.sort(key=lambda x: x.get("_id", {}).get("$oid", ""), reverse=True)
+        # Sort by a simulated timestamp or just take the last few; sort a copy,
+        # since db_data is the shared in-memory database.
+        challenges = sorted(
+            db_data.get("challenges", []),
+            key=lambda x: x.get("_id", {}).get("$oid", ""),
+            reverse=True,
+        )
         return [c["source_text"] for c in challenges[:limit] if "source_text" in c]
 
-    database = get_database()
-    challenges = database["challenges"].find(
+    challenges = challenges_collection.find(
         {"source_text": {"$ne": None}},
         {"source_text": 1, "_id": 0}
     ).sort("_id", -1).limit(limit)
@@ -298,45 +568,44 @@ async def get_recent_challenge_texts(limit: int = 20) -> list[str]:
     texts = await challenges.to_list(length=limit)
     return [item["source_text"] for item in texts]
 
-async def get_challenge_feedback(challenge_id: str) -> list[dict]:
+async def get_challenge_feedback(challenge_id: ObjectId | str) -> list[dict]:
     """Retrieves feedback for a specific challenge."""
     if DEV_MODE:
         # Dev mode doesn't have feedback implemented yet
         return []
-    database = get_database()
-    feedback = database["feedback"].find({"challenge_id": ObjectId(challenge_id)})
+    feedback = feedback_collection.find({"challenge_id": _as_object_id(challenge_id)})
     return await feedback.to_list(length=100)
 
-async def get_all_user_answers_for_challenge(challenge_id: str) -> list[str]:
+async def get_all_user_answers_for_challenge(challenge_id: ObjectId | str) -> list[str]:
     """Retrieves all user answers for a specific challenge."""
     if DEV_MODE:
         db_data = _read_dev_db()
         answers = []
         for sub in db_data.get("submissions", []):
-            if str(sub.get("challenge_id")) == challenge_id and sub.get("user_answer"):
+            if sub.get("challenge_id") == str(challenge_id) and sub.get("user_answer"):
                 answers.append(sub["user_answer"])
         return answers
 
-    database = get_database()
-    submissions = database["submissions"].find(
-        {"challenge_id": ObjectId(challenge_id)},
+    # Empty and missing answers are filtered out server-side so they never cross the wire.
+    submissions = submissions_collection.find(
+        {"challenge_id": _as_object_id(challenge_id), "user_answer": {"$nin": [None, ""]}},
         {"user_answer": 1, "_id": 0}
-    )
-    answers = await submissions.to_list(length=None)
-    return [item["user_answer"] for item in answers if item.get("user_answer")]
+    ).batch_size(500)
+    return [item["user_answer"] async for item in submissions]
 
 class Feedback(BaseModel):
     challenge_id: PyObjectId
     rating: int
     comment: Optional[str] = None
 
+_dump_feedback = partial(Feedback.__pydantic_serializer__.to_python, by_alias=True, exclude_none=True)
+
 async def save_feedback(feedback_data: Feedback) -> ObjectId:
     """Saves user feedback to the database."""
     if DEV_MODE:
         # Dev mode doesn't have feedback implemented yet
         logger.info("Feedback saving is not implemented in dev mode.")
         return ObjectId()
-    database = get_database()
-    feedback_dict = feedback_data.model_dump(by_alias=True, exclude_none=True)
-    result = await database["feedback"].insert_one(feedback_dict)
+    feedback_dict = _dump_feedback(feedback_data)
+    result = await feedback_collection.insert_one(feedback_dict)
     return result.inserted_id
\ No newline at end of file
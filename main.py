@@ -1,15 +1,18 @@
 import os
+import sys
 import logging
 import uvicorn
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from starlette.middleware.sessions import SessionMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
 from api import http_routes, websocket_routes
+from api.responses import ORJSONResponse
 import db_logic
 from db_logic import connect_to_mongo, close_mongo_connection, init_app_mode
 from processors.audio import (
@@ -27,7 +30,9 @@ load_dotenv()
 # Determine run mode from environment variables
 IS_DEV_MODE = os.getenv("DEV_MODE", "false").lower() == "true"
 
-init_app_mode(IS_DEV_MODE)
+# The uvicorn CLI, as run by start.sh and the Dockerfile, takes its worker count
+# from WEB_CONCURRENCY and defaults to one.
+init_app_mode(IS_DEV_MODE, workers=int(os.getenv("WEB_CONCURRENCY", "1")))
 
 # Configure logging with a specific format
 log_level = logging.DEBUG if os.getenv("DEBUG_MODE", "false").lower() == "true" else logging.INFO
@@ -57,9 +62,17 @@ else:
 GEMINI_DEV_MODELS = ["gemini-2.5-flash", "gemini-1.5-flash", "imagen-2", "imagen-3"]
 GEMINI_PROD_MODELS = ["gemini-2.5-pro", "gemini-2.5-flash"]
 GEMINI_TTS_MODEL_NAME = "gemini-2.5-flash"
+GEMINI_WARM_UP_TIMEOUT = 10
 GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", "")
 GOOGLE_CLOUD_LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
 IMAGE_DIR = "sampleimg"
+# Game state lives in the signed session cookie, so every worker must sign with
+# the same key; a per-process random key only works for a single worker.
+SESSION_SECRET_KEY = os.getenv("SESSION_SECRET_KEY")
+# Worker processes for `python main.py` (same variable the uvicorn CLI reads).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# Idle keep-alive, long enough for a player's next request to reuse the connection.
+TIMEOUT_KEEP_ALIVE = int(os.getenv("TIMEOUT_KEEP_ALIVE", "30"))
 
 from api.models import ChallengeResponse, SubmissionResponse, TranscribeResponse
 
@@ -74,6 +87,7 @@ async def lifespan(app: FastAPI):
         await connect_to_mongo()
     else:
         logger.info("Using development database file.")
+    db_logic.start_background_writers()
 
     # --- API Key Check ---
     if not os.getenv("GEMINI_API_KEY"):
@@ -97,6 +111,8 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.critical(f"Failed to initialize core processors: {e}", exc_info=True)
         raise
+    # Failures here are only logged; requests will open the connection themselves.
+    await context.challenge_generator.warm_up(timeout=GEMINI_WARM_UP_TIMEOUT)
 
     # --- Audio Processor Initialization ---
     logger.info("Initializing audio processors...")
@@ -133,15 +149,23 @@ async def lifespan(app: FastAPI):
     
     # --- Lifespan Shutdown ---
     logger.info("="*20 + " Application Lifespan Shutdown " + "="*20)
+    await db_logic.stop_background_writers()
     if not db_logic.DEV_MODE:
         await close_mongo_connection()
     logger.info("Application shutdown complete.")
 
 def create_app():
-    app = FastAPI(lifespan=lifespan)
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
     # Add SessionMiddleware
-    app.add_middleware(SessionMiddleware, secret_key=os.urandom(24))
+    secret_key = SESSION_SECRET_KEY
+    if not secret_key:
+        logger.warning("SESSION_SECRET_KEY not set; using a random per-process key. Sessions will not survive restarts or be shared across workers.")
+        secret_key = os.urandom(24)
+    app.add_middleware(SessionMiddleware, secret_key=secret_key)
+    # Compresses HTML, JSON and static text; already-compressed media such as
+    # the /synthesize audio stream is excluded by the middleware's defaults.
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
     # --- Mount Static Files and API Routers ---
     if os.path.exists(IMAGE_DIR):
@@ -156,10 +180,21 @@ def create_app():
 app = create_app()
 
 if __name__ == "__main__":
+    # The dev database is a single file cached in process memory, and without a
+    # shared SESSION_SECRET_KEY each worker would reject the others' cookies.
+    workers = WEB_CONCURRENCY
+    if IS_DEV_MODE or not SESSION_SECRET_KEY:
+        workers = 1
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8080,
         reload=IS_DEV_MODE,
+        workers=workers,
+        timeout_keep_alive=TIMEOUT_KEEP_ALIVE,
+        # uvicorn's "auto" quietly falls back to the asyncio loop and h11 parser
+        # if these are missing; naming them makes a broken install fail loudly.
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         log_level=logging.getLevelName(logger.getEffectiveLevel()).lower(),
     )
@@ -1,16 +1,40 @@
 import logging
 import os
+from functools import lru_cache
 from typing import TypedDict
 import re
-import json
 
+import orjson
 from genai_processors import processor
-from genai_processors.core import genai_model
 from genai_processors import streams
 from genai_processors.content_api import ProcessorPart
+from google.genai import types as genai_types
+
+from lru import LRUCache
+from processors.json_parts import json_part, read_text
+from processors.throttling import GeminiBusyError, gemini_call
+from processors import gemini_models
 
 logger = logging.getLogger(__name__)
 
+EVALUATION_CACHE_SIZE = 4096
+# Challenge types with a single right answer, checked by string comparison.
+EXACT_MATCH_CHALLENGE_TYPES = frozenset({"gusakuza", "story_translation", "kin_to_eng_proverb", "eng_to_kin_phrase"})
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+FORMAT_REMINDER = "\nReminder: respond ONLY with the JSON object, with no other text."
+
+
+def clean_text(text: str) -> str:
+    """Removes punctuation and extra whitespace, and casefolds for caseless comparison."""
+    text = _PUNCTUATION.sub("", text)
+    text = _WHITESPACE.sub(" ", text)
+    return text.casefold().strip()
+
+
+# Targets repeat across every submission for a challenge, so their clean form is memoized.
+_clean_target = lru_cache(maxsize=EVALUATION_CACHE_SIZE)(clean_text)
+
 
 class AnswerEvaluationInput(TypedDict):
     user_answer: str
@@ -21,63 +45,72 @@ class AnswerEvaluationInput(TypedDict):
 class AnswerEvaluatorProcessor(processor.Processor):
     def __init__(self, model_names: list[str]):
         self.model_names = model_names
-        # Correctly define the multi-line prompt string using triple quotes.
-        self.prompt = '''You are a friendly and encouraging Kinyarwanda language tutor.
+        # The tutor instructions are pinned on the model as its system instruction,
+        # so each request only sends the two answers.
+        self.system_instruction = '''You are a friendly and encouraging Kinyarwanda language tutor.
 Your goal is to provide helpful feedback to a student.
-The correct answer is: '{target_text}'. The user's answer is: '{user_answer}'.
+You will be given the correct answer and the user's answer.
 First, determine if the user's answer is correct. Consider synonyms and minor grammatical variations as correct.
 Then, provide a brief, helpful feedback message.
 If the answer is correct, give a short, positive confirmation.
 If the answer is incorrect, gently correct them and provide the right answer.
 Respond ONLY with a JSON object in the format: {"is_correct": true, "feedback": "your message here"}.
 Do not add any other text or formatting.'''
+        self.prompt = "The correct answer is: '{target_text}'. The user's answer is: '{user_answer}'."
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables.")
         self.api_key = api_key
-    
-    def _clean_text(self, text: str) -> str:
-        """Removes punctuation, and extra whitespace and converts to lowercase."""
-        # Remove punctuation using a more robust regex
-        text = re.sub(r"[^\\w\\s]", "", text)
-        # Normalize whitespace
-        text = re.sub(r"\\s+", " ", text)
-        return text.lower().strip()
+        # LLM verdicts keyed by (challenge_type, target_text, normalized answer), so a
+        # retried or commonly given answer does not cost another model call.
+        self._evaluation_cache: LRUCache[tuple[str, str, str], dict] = LRUCache(EVALUATION_CACHE_SIZE)
+        self._models = gemini_models.ModelRegistry(
+            api_key,
+            model_names,
+            genai_types.GenerateContentConfig(system_instruction=self.system_instruction),
+        )
 
+    @staticmethod
+    def _evaluation_key(user_answer: str, target_text: str, challenge_type: str) -> tuple[str, str, str]:
+        return challenge_type, target_text, " ".join(user_answer.casefold().split())
+    
     async def call(
         self,
         input_stream: streams.AsyncIterable[ProcessorPart]
     ) -> streams.AsyncIterable[ProcessorPart]:
-        input_json = ""
-        async for part in input_stream:
-            if part.text:
-                input_json += part.text
-        
+        input_json = await read_text(input_stream)
+
         try:
-            input_data = json.loads(input_json)
+            input_data = orjson.loads(input_json)
             user_answer = input_data["user_answer"]
             target_text = input_data["target_text"]
             challenge_type = input_data["challenge_type"]
 
             # --- Simple Evaluation for definitive challenges ---
-            if challenge_type in ["gusakuza", "story_translation", "kin_to_eng_proverb", "eng_to_kin_phrase"]:
-                is_correct = self._clean_text(user_answer) == self._clean_text(target_text)
+            if challenge_type in EXACT_MATCH_CHALLENGE_TYPES:
+                is_correct = clean_text(user_answer) == _clean_target(target_text)
                 if is_correct:
                     feedback = "Correct!"
                 else:
                     feedback = f"Not quite. The correct answer is: {target_text}"
-                yield ProcessorPart(json.dumps({"is_correct": is_correct, "feedback": feedback}))
+                yield json_part({"is_correct": is_correct, "feedback": feedback})
                 return
 
             # --- Always-correct Evaluation for creative challenges ---
             if challenge_type == "image_description":
                 is_correct = True
                 feedback = "Thank you for your creative description!"
-                yield ProcessorPart(json.dumps({"is_correct": is_correct, "feedback": feedback}))
+                yield json_part({"is_correct": is_correct, "feedback": feedback})
                 return
 
             # --- LLM-based Evaluation for nuanced challenges (if any) ---
             # (Currently, all challenges are handled above, but this structure allows for future expansion)
+            cache_key = self._evaluation_key(user_answer, target_text, challenge_type)
+            cached = self._evaluation_cache.get(cache_key)
+            if cached is not None:
+                yield json_part(cached)
+                return
+
             prompt_input = AnswerEvaluationInput(
                 user_answer=user_answer,
                 target_text=target_text,
@@ -85,35 +118,47 @@ Do not add any other text or formatting.'''
             )
             
             formatted_prompt = self.prompt.format(**prompt_input)
-            logger.info(f"--- GenAI-Processor REQUEST (LLM Eval) ---\\nPROMPT: {formatted_prompt}\\n")
+            logger.debug("--- GenAI-Processor REQUEST (LLM Eval) ---\nPROMPT: %s\n", formatted_prompt)
 
             for model_name in self.model_names:
                 try:
                     response = ""
-                    model = genai_model.GenaiModel(model_name=model_name, api_key=self.api_key)
+                    model = self._models.get(model_name)
                     model_input_stream = streams.stream_content([ProcessorPart(formatted_prompt)])
-                    async for part in model(model_input_stream):
-                        if part.text:
-                            response += part.text
+                    async with gemini_call(model_name):
+                        async for part in model(model_input_stream):
+                            if part.text:
+                                response += part.text
                     
-                    logger.info(f"--- GenAI-Processor RESPONSE (model: {model_name}) ---\\nRESPONSE: {response}\\n")
+                    logger.debug("--- GenAI-Processor RESPONSE (model: %s) ---\nRESPONSE: %s\n", model_name, response)
                     
                     cleaned_response = response.strip().replace("```json", "").replace("```", "")
-                    response_data = json.loads(cleaned_response)
-                    yield ProcessorPart(json.dumps(response_data))
+                    response_data = orjson.loads(cleaned_response)
+                    self._evaluation_cache.put(cache_key, response_data)
+                    yield json_part(response_data)
                     return
+                except orjson.JSONDecodeError as e:
+                    # A malformed reply tends to repeat for the same prompt, so the next
+                    # model gets an explicit reminder of the format instead.
+                    logger.error("Malformed evaluation from model %s: %s", model_name, e)
+                    if not formatted_prompt.endswith(FORMAT_REMINDER):
+                        formatted_prompt += FORMAT_REMINDER
+                    continue
+                except GeminiBusyError as e:
+                    logger.warning("Answer evaluation skipped: %s", e)
+                    break
                 except Exception as e:
-                    logger.error(f"Error evaluating answer with processor (model: {model_name}): {e}")
+                    logger.error("Error evaluating answer with processor (model: %s): %s", model_name, e)
                     continue
             
             logger.error("All models failed. Falling back to simple string matching for correctness.")
-            is_correct = self._clean_text(user_answer) == self._clean_text(target_text)
+            is_correct = clean_text(user_answer) == _clean_target(target_text)
             feedback = "Correct!" if is_correct else f"Incorrect. The correct answer is: {target_text}"
-            yield ProcessorPart(json.dumps({"is_correct": is_correct, "feedback": feedback, "fallback": True}))
+            yield json_part({"is_correct": is_correct, "feedback": feedback, "fallback": True})
 
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.error(f"Error processing input for evaluation: {e}")
-            yield ProcessorPart(json.dumps({"error": "Invalid input format."}))
+        except (orjson.JSONDecodeError, KeyError) as e:
+            logger.error("Error processing input for evaluation: %s", e)
+            yield json_part({"error": "Invalid input format."})
 
     async def evaluate_answer(
         self,
@@ -121,20 +166,15 @@ Do not add any other text or formatting.'''
         target_text: str,
         challenge_type: str
     ) -> dict:
-        input_json = json.dumps({
+        input_stream = streams.stream_content([json_part({
             "user_answer": user_answer,
             "target_text": target_text,
             "challenge_type": challenge_type,
-        })
-        
-        response_json = ""
-        input_stream = streams.stream_content([ProcessorPart(input_json)])
-        async for part in self(input_stream):
-            if part.text:
-                response_json += part.text
-        
+        })])
+        response_json = await read_text(self(input_stream))
+
         try:
-            return json.loads(response_json)
-        except json.JSONDecodeError:
+            return orjson.loads(response_json)
+        except orjson.JSONDecodeError:
             logger.error("Failed to decode JSON response from evaluation chain.")
             return {"is_correct": False, "feedback": "Sorry, there was an error evaluating your answer."}
\ No newline at end of file
@@ -42,7 +42,7 @@ def create_gemini_text_to_speech_processor(model_name: str) -> Processor:
     @part_processor_function
     async def gemini_text_to_audio(part: ProcessorPart) -> AsyncGenerator[ProcessorPart, None]:
         if part.text:
-            logger.info(f"DEV MODE (TTS): Simulating Gemini text-to-speech for: {part.text}")
+            logger.info("DEV MODE (TTS): Simulating Gemini text-to-speech for: %s", part.text)
             yield ProcessorPart(b"simulated audio data", mimetype="audio/mpeg")
     return gemini_text_to_audio
 
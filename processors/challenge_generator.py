@@ -1,19 +1,40 @@
 import os
-import json
+import asyncio
 import random
 import re
 import logging
 from typing import TypedDict, Any, Dict, AsyncIterator
 
-from PIL import Image
+import orjson
 from genai_processors import processor
-from genai_processors.core import genai_model
 from genai_processors import streams
 from genai_processors.content_api import ProcessorPart
 
 from db_logic import GameState
+from lru import LRUCache
+from processors.json_parts import json_part, read_text
+from processors.throttling import GeminiBusyError, gemini_call
+from processors import gemini_models
 
 logger = logging.getLogger(__name__)
+_rng = random.Random()
+
+# Heading and emphasis markers the models sometimes wrap "source|target" replies in.
+_MARKDOWN_MARKERS = re.compile(r'#+\s*|\*+\s*')
+_IMAGE_MIMETYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+DIFFICULTY_LEVELS = {1: "beginner", 2: "intermediate", 3: "advanced"}
+TRANSLATION_CHALLENGE_TYPES = ("kin_to_eng_proverb", "eng_to_kin_phrase")
+# Prompts whose reply only depends on their inputs, so it can be reused for the
+# same riddle or chapter. Challenge content itself is never reused, to keep it fresh.
+MEMOIZED_PROMPTS = frozenset({"riddle_hint", "instruction_generation"})
+RESPONSE_CACHE_SIZE = 1024
+
+
+def _write_file(path: str, data: bytes):
+    """Writes data to path, creating its directory; blocking, so run it off the event loop."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
 
 
 class ChallengeInput(TypedDict):
@@ -30,11 +51,21 @@ class ChallengeGeneratorProcessor(processor.Processor):
     def __init__(self, model_names: list[str], image_dir: str = "static/sampleimg"):
         self.model_names = model_names
         self.image_dir = image_dir
-        self.ibisakuzo_examples = self._load_riddles()
+        # Raw bytes and mimetype of each sample image, read once so a challenge
+        # neither touches the disk nor decodes and re-encodes the image.
+        self.images = self._load_images()
+        self.image_files = tuple(self.images)
+        # Each riddle pre-joined into the "riddle|answer" target a Sakwe round starts with.
+        self.riddle_targets = tuple(f"{r['riddle']}|{r['answer']}" for r in self._load_riddles())
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables.")
         self.api_key = api_key
+        self._models = gemini_models.ModelRegistry(api_key, model_names)
+        # Text generations in flight, keyed by their formatted prompt.
+        self._inflight: dict[str, asyncio.Future[str]] = {}
+        # Replies to MEMOIZED_PROMPTS, keyed by their formatted prompt.
+        self._responses: LRUCache[str, str] = LRUCache(RESPONSE_CACHE_SIZE)
 
         # --- Prompt Definitions ---
         self.prompts = {
@@ -81,44 +112,93 @@ class ChallengeGeneratorProcessor(processor.Processor):
             ),
         }
 
-    def _load_riddles(self) -> list:
+    def _load_riddles(self) -> tuple:
         try:
-            with open("riddles.json", "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            with open("riddles.json", "rb") as f:
+                return tuple(orjson.loads(f.read()))
+        except (FileNotFoundError, orjson.JSONDecodeError) as e:
             logger.warning(f"Could not load riddles.json: {e}. Riddles will be unavailable.")
-            return []
+            return ()
+
+    def _load_images(self) -> dict[str, tuple[bytes, str]]:
+        """Reads the sample images once; the directory only changes on deploy."""
+        images = {}
+        try:
+            names = os.listdir(self.image_dir)
+        except FileNotFoundError:
+            logger.warning(f"Image directory {self.image_dir} not found. Image challenges will be unavailable.")
+            return images
+        for name in names:
+            mimetype = _IMAGE_MIMETYPES.get(os.path.splitext(name)[1].lower())
+            if not mimetype:
+                continue
+            try:
+                with open(os.path.join(self.image_dir, name), "rb") as f:
+                    images[name] = (f.read(), mimetype)
+            except OSError as e:
+                logger.warning(f"Could not read image {name}: {e}")
+        return images
 
     async def _generate_static_challenge(self, game_mode: str) -> dict:
-        logger.info(f"Generating static fallback challenge for game_mode: {game_mode}")
+        logger.info("Generating static fallback challenge for game_mode: %s", game_mode)
         if game_mode == "sakwe":
             return {"challenge_type": "gusakuza_init", "source_text": "Sakwe sakwe!", "target_text": "Igisakuzo|Some Answer", "context": "Reply with 'soma' to get the riddle."}
         elif game_mode == "image":
-            return {"challenge_type": "image_description", "source_text": f"/static/sampleimg/{random.choice(os.listdir(self.image_dir))}", "target_text": "A beautiful Rwandan landscape.", "context": "This is a fallback image challenge."}
+            if not self.image_files:
+                return {"error_message": f"No images found in {self.image_dir}."}
+            return {"challenge_type": "image_description", "source_text": f"/static/sampleimg/{_rng.choice(self.image_files)}", "target_text": "A beautiful Rwandan landscape.", "context": "This is a fallback image challenge."}
         else:
             return {"challenge_type": "kin_to_eng_proverb", "source_text": "Akabando k'iminsi gacibwa kare", "target_text": "A walking stick for old age is prepared in advance", "context": "Translate this Kinyarwanda proverb to English."}
 
+    async def warm_up(self, timeout: float):
+        """Opens the primary model's connection to the Gemini API before the first request needs it."""
+        await gemini_models.warm_up(self.api_key, self.model_names[0], timeout)
+
     async def _run_text_processor(self, processor_input: Dict[str, Any], prompt_key: str) -> str:
-        prompt = self.prompts[prompt_key]
-        log_prompt = prompt.format(**processor_input)
-        logger.info(f"\n--- GenAI-Processor REQUEST ---\nPROMPT: {log_prompt}\n")
+        prompt = self.prompts[prompt_key].format(**processor_input)
+        if "image" in processor_input:
+            return await self._generate_text(prompt, processor_input["image"])
+
+        if prompt_key in MEMOIZED_PROMPTS:
+            cached = self._responses.get(prompt)
+            if cached is not None:
+                return cached
+
+        # Identical prompts already in flight share one model call.
+        generation = self._inflight.get(prompt)
+        if generation is None:
+            generation = self._inflight[prompt] = asyncio.ensure_future(self._generate_text(prompt))
+            generation.add_done_callback(lambda _: self._inflight.pop(prompt, None))
+        # Shielded so one caller going away does not cancel the call for the others.
+        response = await asyncio.shield(generation)
+        if response and prompt_key in MEMOIZED_PROMPTS:
+            self._responses.put(prompt, response)
+        return response
+
+    async def _generate_text(self, prompt: str, image: Any = None) -> str:
+        logger.debug("\n--- GenAI-Processor REQUEST ---\nPROMPT: %s\n", prompt)
 
         for model_name in self.model_names:
             try:
-                processor = genai_model.GenaiModel(model_name=model_name, api_key=self.api_key)
+                processor = self._models.get(model_name)
                 response = ""
-                parts = [ProcessorPart(log_prompt)]
-                if "image" in processor_input:
-                    parts.append(ProcessorPart(processor_input["image"]))
+                parts = [ProcessorPart(prompt)]
+                if image is not None:
+                    parts.append(ProcessorPart(image))
                 
                 input_stream = streams.stream_content(parts)
-                async for part in processor(input_stream):
-                    if part.text:
-                        response += part.text
-                logger.info(f"\n--- GenAI-Processor RESPONSE (model: {model_name}) ---\nRESPONSE: {response}\n")
+                async with gemini_call(model_name):
+                    async for part in processor(input_stream):
+                        if part.text:
+                            response += part.text
+                logger.debug("\n--- GenAI-Processor RESPONSE (model: %s) ---\nRESPONSE: %s\n", model_name, response)
                 return response
+            except GeminiBusyError as e:
+                # The limits are shared by every model, so the next one would wait just as long.
+                logger.warning("GenAI Processor call skipped: %s", e)
+                break
             except Exception as e:
-                logger.warning(f"GenAI Processor call failed for model {model_name}: {e}")
+                logger.warning("GenAI Processor call failed for model %s: %s", model_name, e)
                 continue
         
         logger.error("All models failed.")
@@ -127,13 +207,17 @@ class ChallengeGeneratorProcessor(processor.Processor):
     async def _run_image_generation_processor(self, prompt: str, image_models: list[str]) -> bytes:
         for model_name in image_models:
             try:
-                processor = genai_model.GenaiModel(model_name=model_name, api_key=self.api_key)
+                processor = self._models.get(model_name)
                 input_stream = streams.stream_content([ProcessorPart(prompt)])
-                async for part in processor(input_stream):
-                    if part.image:
-                        return part.image
+                async with gemini_call(model_name):
+                    async for part in processor(input_stream):
+                        if part.image:
+                            return part.image
+            except GeminiBusyError as e:
+                logger.warning("Image generation skipped: %s", e)
+                break
             except Exception as e:
-                logger.warning(f"Image generation failed for model {model_name}: {e}")
+                logger.warning("Image generation failed for model %s: %s", model_name, e)
                 continue
         return None
 
@@ -143,33 +227,30 @@ class ChallengeGeneratorProcessor(processor.Processor):
             response_text = await self._run_text_processor(processor_input, "riddle_hint")
             
             if not response_text: return {"error": "Failed to generate hint."}
-            parts = response_text.split("|")
+            parts = response_text.split("|", 2)
             if len(parts) < 2: return {"error": "Invalid hint format from model."}
             hint = parts[0].replace("Hint:", "").strip()
             translation = parts[1].replace("Translation:", "").strip()
             return {"hint": hint, "translation": translation}
         except Exception as e:
-            logger.error(f"Error generating hint: {e}", exc_info=True)
+            logger.error("Error generating hint: %s", e, exc_info=True)
             return {"error": "An unexpected error occurred while generating the hint."}
 
     async def call(self, input_stream: streams.AsyncIterable[ProcessorPart]) -> streams.AsyncIterable[ProcessorPart]:
-        input_json = ""
-        async for part in input_stream:
-            if part.text:
-                input_json += part.text
-        
+        input_json = await read_text(input_stream)
+
         try:
-            input_data = json.loads(input_json)
+            input_data = orjson.loads(input_json)
             # Note the change here: we now expect a dictionary with 'challenge' and 'state'
             result_data = await self._generate_challenge_logic(
-                input_data["difficulty"], GameState(**input_data["state"]),
+                input_data["difficulty"], GameState.model_validate(input_data["state"]),
                 input_data["game_mode"]
             )
             # We serialize the entire result dictionary
-            yield ProcessorPart(json.dumps(result_data))
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.error(f"Error processing input for challenge generation: {e}")
-            yield ProcessorPart(json.dumps({"error": "Invalid input format."}))
+            yield json_part(result_data)
+        except (orjson.JSONDecodeError, KeyError) as e:
+            logger.error("Error processing input for challenge generation: %s", e)
+            yield json_part({"error": "Invalid input format."})
 
     async def _generate_challenge_logic(self, difficulty: int, state: GameState, game_mode: str) -> dict:
         '''
@@ -178,23 +259,25 @@ class ChallengeGeneratorProcessor(processor.Processor):
         '''
         challenge = {}
         try:
-            level = {1: "beginner", 2: "intermediate", 3: "advanced"}.get(difficulty, "intermediate")
+            level = DIFFICULTY_LEVELS.get(difficulty, "intermediate")
             
             # --- Story Generation and Context Persistence ---
             # If there's no story or the story is finished, create a new one.
             # This state change will be passed back to the API layer.
-            if not state.story or state.story_chapter >= len(json.loads(state.story).get("chapters", [])):
+            # The story is parsed once here and the dict is used for the rest of the request.
+            story_data = orjson.loads(state.story) if state.story else None
+            if not story_data or state.story_chapter >= len(story_data.get("chapters", [])):
                 story_json_str = await self._run_text_processor({}, "story_creation")
                 if not story_json_str:
                     challenge = await self._generate_static_challenge(game_mode)
                 else:
                     try:
-                        state.story = json.dumps(json.loads(story_json_str.strip().replace("```json", "").replace("```", "")))
+                        story_data = orjson.loads(story_json_str.strip().replace("```json", "").replace("```", ""))
+                        state.story = orjson.dumps(story_data).decode()
                         state.story_chapter = 0
-                    except json.JSONDecodeError:
+                    except orjson.JSONDecodeError:
                         challenge = await self._generate_static_challenge(game_mode)
             
-            story_data = json.loads(state.story)
             story_context = story_data["chapters"][state.story_chapter]
             
             processor_input = ChallengeInput(
@@ -208,7 +291,7 @@ class ChallengeGeneratorProcessor(processor.Processor):
                 response_text = await self._run_text_processor(processor_input, "story_translation")
                 context = f"Chapter {state.story_chapter + 1}: {story_context}"
                 state.story_chapter += 1 # This state change is now persisted
-                parts = re.sub(r'#+\s*|\*+\s*', '', response_text).strip().split("|")
+                parts = _MARKDOWN_MARKERS.sub('', response_text).strip().split("|", 2)
                 if len(parts) < 2:
                     challenge = await self._generate_static_challenge(game_mode)
                 else:
@@ -217,25 +300,24 @@ class ChallengeGeneratorProcessor(processor.Processor):
                         "target_text": parts[1].strip(), "context": context
                     }
             elif game_mode == "sakwe":
-                if not self.ibisakuzo_examples:
+                if not self.riddle_targets:
                     challenge = {"error_message": "Riddle database is empty."}
                 else:
-                    riddle_data = random.choice(self.ibisakuzo_examples)
                     challenge = {
                         "challenge_type": "gusakuza_init", "source_text": "Sakwe sakwe!", 
-                        "target_text": f"{riddle_data['riddle']}|{riddle_data['answer']}", 
+                        "target_text": _rng.choice(self.riddle_targets), 
                         "context": "Reply with 'soma' to get the riddle."
                     }
             elif game_mode == "image":
                 # ... (image generation logic remains the same, but now uses story_context)
                 # This part is already using story_context correctly.
-                image_files = [f for f in os.listdir(self.image_dir) if f.endswith((".png", ".jpg", ".jpeg"))]
+                image_files = self.image_files
                 if not image_files:
                     challenge = {"error_message": f"No images found in {self.image_dir}."}
                 else:
                     try:
-                        img = Image.open(os.path.join(self.image_dir, random.choice(image_files)))
-                        prompt_input = {"image": img, "story_context": story_context}
+                        image_data, image_mimetype = self.images[_rng.choice(image_files)]
+                        prompt_input = {"image": ProcessorPart(image_data, mimetype=image_mimetype), "story_context": story_context}
                         image_prompt = await self._run_text_processor(prompt_input, "image_prompt_generation")
                         if not image_prompt:
                             challenge = await self._generate_static_challenge(game_mode)
@@ -246,24 +328,27 @@ class ChallengeGeneratorProcessor(processor.Processor):
                                 challenge = await self._generate_static_challenge(game_mode)
                             else:
                                 gen_path = os.path.join("static", "generated", "generated_image.png")
-                                os.makedirs(os.path.dirname(gen_path), exist_ok=True)
-                                with open(gen_path, "wb") as f: f.write(generated_image_data)
-                                
-                                instruction = await self._run_text_processor(
-                                    {"story_context": story_context, "challenge_type": "image_description"}, "instruction_generation"
+                                _, instruction = await asyncio.gather(
+                                    asyncio.to_thread(_write_file, gen_path, generated_image_data),
+                                    self._run_text_processor(
+                                        {"story_context": story_context, "challenge_type": "image_description"}, "instruction_generation"
+                                    ),
                                 )
                                 challenge = {
                                     "challenge_type": "image_description", "source_text": "/" + gen_path,
                                     "target_text": "There is no correct answer for this challenge.", "context": instruction
                                 }
                     except Exception as e:
-                        logger.error(f"Failed to process image: {e}")
+                        logger.error("Failed to process image: %s", e)
                         challenge = await self._generate_static_challenge(game_mode)
             else: # Translation
-                processor_input["challenge_type"] = random.choice(["kin_to_eng_proverb", "eng_to_kin_phrase"])
-                response_text = await self._run_text_processor(processor_input, processor_input["challenge_type"])
-                context = await self._run_text_processor(processor_input, "instruction_generation")
-                parts = re.sub(r'#+\s*|\*+\s*', '', response_text).strip().split("|")
+                processor_input["challenge_type"] = _rng.choice(TRANSLATION_CHALLENGE_TYPES)
+                # The pair and its instruction only share the input, so both calls run at once.
+                response_text, context = await asyncio.gather(
+                    self._run_text_processor(processor_input, processor_input["challenge_type"]),
+                    self._run_text_processor(processor_input, "instruction_generation"),
+                )
+                parts = _MARKDOWN_MARKERS.sub('', response_text).strip().split("|", 2)
                 if len(parts) < 2:
                     challenge = await self._generate_static_challenge(game_mode)
                 else:
@@ -272,11 +357,11 @@ class ChallengeGeneratorProcessor(processor.Processor):
                         "target_text": parts[1].strip(), "context": context
                     }
         except Exception as e:
-            logger.error(f"Error generating challenge: {e}", exc_info=True)
+            logger.error("Error generating challenge: %s", e, exc_info=True)
             challenge = await self._generate_static_challenge(game_mode)
 
         # --- Return both challenge and state ---
         return {
             "challenge": challenge,
-            "state": json.loads(state.model_dump_json()) # Ensure state is JSON serializable
+            "state": state.model_dump(mode="json") # Ensure state is JSON serializable
         }
\ No newline at end of file
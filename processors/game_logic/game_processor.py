@@ -1,13 +1,14 @@
-import json
 import logging
 from typing import AsyncIterable
 
+import orjson
 from genai_processors import processor
 from genai_processors import streams
 from genai_processors.content_api import ProcessorPart
 
 from processors.challenge_generator import ChallengeGeneratorProcessor
 from processors.answer_evaluator import AnswerEvaluatorProcessor
+from processors.json_parts import json_part, join_text
 
 logger = logging.getLogger(__name__)
 
@@ -19,41 +20,36 @@ class GameProcessor(processor.Processor):
         self.answer_evaluator = answer_evaluator
 
     async def call(self, input_stream: AsyncIterable[ProcessorPart]) -> AsyncIterable[ProcessorPart]:
-        input_json = ""
-        async for part in input_stream:
-            if part.text:
-                input_json += part.text
-        
+        input_parts = [part async for part in input_stream]
+
         try:
-            input_data = json.loads(input_json)
+            input_data = orjson.loads(join_text(input_parts))
             action = input_data.get("action")
 
             if action == "get_challenge":
-                # Pass the entire dictionary to the challenge generator
-                chain_input_stream = streams.stream_content([ProcessorPart(json.dumps(input_data))])
+                # Forward the original parts; re-encoding the dictionary would only be parsed again
+                chain_input_stream = streams.stream_content(input_parts)
                 async for part in self.challenge_generator(chain_input_stream):
                     yield part
             
             elif action == "evaluate_answer":
-                # Pass the entire dictionary to the answer evaluator
-                chain_input_stream = streams.stream_content([ProcessorPart(json.dumps(input_data))])
+                # Forward the original parts; re-encoding the dictionary would only be parsed again
+                chain_input_stream = streams.stream_content(input_parts)
                 async for part in self.answer_evaluator(chain_input_stream):
                     yield part
 
             elif action == "get_hint":
                 riddle = input_data.get("riddle")
                 if not riddle:
-                    yield ProcessorPart(json.dumps({"error": "Riddle not provided for hint."}));
+                    yield json_part({"error": "Riddle not provided for hint."});
                     return
                 
                 hint_data = await self.challenge_generator.generate_hint(riddle)
-                yield ProcessorPart(json.dumps(hint_data))
+                yield json_part(hint_data)
             
             else:
-                error_message = json.dumps({"error": "Invalid action specified."})
-                yield ProcessorPart(error_message)
+                yield json_part({"error": "Invalid action specified."})
 
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.error(f"Error processing game logic request: {e}")
-            error_message = json.dumps({"error": "Invalid input format for game processor."})
-            yield ProcessorPart(error_message)
+        except (orjson.JSONDecodeError, KeyError) as e:
+            logger.error("Error processing game logic request: %s", e)
+            yield json_part({"error": "Invalid input format for game processor."})
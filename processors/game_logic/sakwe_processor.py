@@ -1,16 +1,17 @@
-import asyncio
 from enum import Enum, auto
 import random
 import logging
-import json
 import os
 import re
 
+import orjson
 from genai_processors import content_api
 from genai_processors import processor
 from genai_processors import streams
 
 logger = logging.getLogger(__name__)
+_rng = random.Random()
+_PUNCTUATION = re.compile(r'[^\w\s]')
 
 
 class GameState(Enum):
@@ -26,42 +27,45 @@ class SakweProcessor(processor.Processor):
         self.state = GameState.WAITING_FOR_SAKWE
         self.current_riddle = ""
         self.current_answer = ""
+        self.answer_pattern: re.Pattern | None = None
         self.riddles = self._load_riddles()
-        self.output_queue = asyncio.Queue()
         self.seen_riddles = set()
         self.current_attempts = 0
 
     def _load_riddles(self):
         riddles_path = os.path.join(os.path.dirname(__file__), '..', '..', 'riddles.json')
         try:
-            with open(riddles_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            with open(riddles_path, 'rb') as f:
+                return tuple(orjson.loads(f.read()))
+        except (FileNotFoundError, orjson.JSONDecodeError) as e:
             logger.error(f"Could not load riddles: {e}")
-            return []
+            return ()
 
-    def _is_answer_correct(self, user_answer: str) -> bool:
-        """Checks if the user's answer is correct with flexible matching."""
+    @staticmethod
+    def _compile_answer_pattern(answer: str) -> re.Pattern | None:
+        """Compiles the answer's keywords into a single case-insensitive alternation."""
         # Normalize the correct answer: lowercase, remove punctuation, split into words.
-        normalized_correct = re.sub(r'[^\w\s]', '', self.current_answer.lower())
+        normalized_correct = _PUNCTUATION.sub('', answer.lower())
         correct_keywords = set(normalized_correct.split())
+        if not correct_keywords:
+            return None
+        return re.compile("|".join(map(re.escape, correct_keywords)), re.IGNORECASE)
 
-        # Normalize the user's answer: lowercase
-        normalized_user = user_answer.lower()
-        
+    def _is_answer_correct(self, user_answer: str) -> bool:
+        """Checks if the user's answer is correct with flexible matching."""
         # Check if any of the keywords from the correct answer are in the user's answer.
-        return any(keyword in normalized_user for keyword in correct_keywords)
+        return self.answer_pattern is not None and self.answer_pattern.search(user_answer) is not None
 
     async def _process_audio(self, audio_data: bytes) -> str:
         """Converts audio to text using the STT processor."""
         transcript_parts = await processor.apply_async(self.stt, [content_api.ProcessorPart(audio_data, mimetype="audio/mpeg")])
         return "".join(part.text for part in transcript_parts if part.text).lower().strip()
 
-    async def speak(self, text: str):
-        """Sends text to the TTS processor to be spoken to the user."""
+    async def speak(self, text: str) -> streams.AsyncIterable[content_api.ProcessorPart]:
+        """Streams the TTS processor's audio for the text to be spoken to the user."""
         async for part in self.tts(streams.stream_content([content_api.ProcessorPart(text)])):
             if part.audio:
-                await self.output_queue.put(part)
+                yield part
 
     def _select_new_riddle(self):
         unseen_riddles = [r for r in self.riddles if r['riddle'] not in self.seen_riddles]
@@ -69,9 +73,10 @@ class SakweProcessor(processor.Processor):
             self.seen_riddles.clear()
             unseen_riddles = self.riddles
         
-        riddle_data = random.choice(unseen_riddles)
+        riddle_data = _rng.choice(unseen_riddles)
         self.current_riddle = riddle_data["riddle"]
         self.current_answer = riddle_data["answer"]
+        self.answer_pattern = self._compile_answer_pattern(self.current_answer)
         self.seen_riddles.add(self.current_riddle)
         self.current_attempts = 0
 
@@ -102,35 +107,33 @@ class SakweProcessor(processor.Processor):
             if not transcript:
                 continue
 
-            logger.info(f"Heard: '{transcript}', State: {self.state.name}")
+            logger.info("Heard: '%s', State: %s", transcript, self.state.name)
 
             if self.state == GameState.WAITING_FOR_SAKWE:
                 if "sakwe" in transcript:
                     self.state = GameState.WAITING_FOR_SOMA
-                    await self.speak("Soma!")
+                    async for speech in self.speak("Soma!"):
+                        yield speech
 
             elif self.state == GameState.WAITING_FOR_SOMA:
                 if "soma" in transcript:
                     self._select_new_riddle()
                     self.state = GameState.WAITING_FOR_ANSWER
-                    await self.speak(self.current_riddle)
+                    async for speech in self.speak(self.current_riddle):
+                        yield speech
 
             elif self.state == GameState.WAITING_FOR_ANSWER:
                 if self._is_answer_correct(transcript):
-                    await self.speak("Correct!")
+                    async for speech in self.speak("Correct!"):
+                        yield speech
                     self.state = GameState.WAITING_FOR_SAKWE
                 else:
                     self.current_attempts += 1
                     if self.current_attempts >= 3:
-                        await self.speak(f"The correct answer is {self.current_answer}. Let's try another one.")
+                        async for speech in self.speak(f"The correct answer is {self.current_answer}. Let's try another one."):
+                            yield speech
                         self.state = GameState.WAITING_FOR_SAKWE
                     else:
                         hint = await self._get_hint(transcript)
-                        await self.speak(hint)
-        
-        yield
-
-    async def __call__(self, content: streams.AsyncIterable[content_api.ProcessorPart]) -> streams.AsyncIterable[content_api.ProcessorPart]:
-        asyncio.create_task(self.call(content))
-        while True:
-            yield await self.output_queue.get()
+                        async for speech in self.speak(hint):
+                            yield speech
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from functools import lru_cache
+
+import httpx
+from genai_processors.core import genai_model
+from google import genai
+from google.genai import types as genai_types
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def http_options() -> genai_types.HttpOptions:
+    """HTTP options that route every Gemini client in the process over one connection pool.
+
+    GenaiModel builds its own genai.Client, so a warm connection is only reused
+    when the clients share the transport underneath them.
+    """
+    return genai_types.HttpOptions(httpx_async_client=httpx.AsyncClient())
+
+
+class ModelRegistry:
+    """One GenaiModel per model name, shared by every request."""
+
+    def __init__(
+        self,
+        api_key: str,
+        model_names: list[str],
+        generate_content_config: genai_types.GenerateContentConfig | None = None,
+    ):
+        self._api_key = api_key
+        self._config = generate_content_config
+        self._models: dict[str, genai_model.GenaiModel] = {}
+        # Build the configured models up front so the first request does not pay for it.
+        for model_name in model_names:
+            self.get(model_name)
+
+    def get(self, model_name: str) -> genai_model.GenaiModel:
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = genai_model.GenaiModel(
+                model_name=model_name,
+                api_key=self._api_key,
+                generate_content_config=self._config,
+                http_options=http_options(),
+            )
+        return model
+
+
+async def warm_up(api_key: str, model_name: str, timeout: float):
+    """Opens a pooled connection to the Gemini API before the first request needs it."""
+    client = genai.Client(api_key=api_key, http_options=http_options())
+    try:
+        # A metadata lookup generates no tokens; the TLS connection it opens
+        # stays in the shared pool for the models' first calls.
+        await asyncio.wait_for(client.aio.models.get(model=model_name), timeout)
+        logger.info("Warmed up Gemini connection for model %s.", model_name)
+    except Exception as e:
+        logger.warning("Gemini warm-up failed for model %s: %s", model_name, e)
@@ -0,0 +1,34 @@
+from typing import Any, AsyncIterable, Callable
+
+import orjson
+from genai_processors.content_api import ProcessorPart
+
+JSON_MIMETYPE = "application/json"
+
+
+def json_part(data: Any, default: Callable[[Any], Any] | None = None) -> ProcessorPart:
+    """Wraps a JSON-serializable value in a ProcessorPart, encoded once with orjson."""
+    return ProcessorPart(orjson.dumps(data, default=default), mimetype=JSON_MIMETYPE)
+
+
+def raw_json_part(payload: bytes) -> ProcessorPart:
+    """Wraps already-encoded JSON bytes in a ProcessorPart."""
+    return ProcessorPart(payload, mimetype=JSON_MIMETYPE)
+
+
+def join_text(parts: list[ProcessorPart]) -> bytearray:
+    """Concatenates the text of already-collected parts into one UTF-8 buffer."""
+    buffer = bytearray()
+    for part in parts:
+        if part.text:
+            buffer += part.text.encode()
+    return buffer
+
+
+async def read_text(stream: AsyncIterable[ProcessorPart]) -> bytearray:
+    """Accumulates a stream's text into one UTF-8 buffer that orjson can parse directly."""
+    buffer = bytearray()
+    async for part in stream:
+        if part.text:
+            buffer += part.text.encode()
+    return buffer
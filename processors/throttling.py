@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import re
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import httpx
+from google.genai import errors as genai_errors
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute this process lets through to Gemini; 0 disables the limit.
+# Like every limit here it is per process, so the API sees it multiplied by the
+# number of workers.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+# Consecutive failures after which a model is skipped for GEMINI_BREAKER_RESET
+# seconds; 0 disables the breaker.
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+# Ceiling for concurrent Gemini requests; the working limit backs off from it
+# while the API reports overload and creeps back up as calls succeed.
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "8"))
+# Longest a call queues for a concurrency slot and a rate-limit token before it
+# gives up and its caller falls back; 0 waits indefinitely.
+GEMINI_MAX_QUEUE_WAIT = float(os.getenv("GEMINI_MAX_QUEUE_WAIT", "5"))
+
+_DURATION = re.compile(r"^\s*([\d.]+)s\s*$")
+
+
+class RateLimiter:
+    """A token bucket that also honors cool-downs requested by the server.
+
+    Callers wait for a token before each request instead of firing and backing
+    off after a 429; when a 429 does come back with a retry delay, every caller
+    holds off until it has passed.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int):
+        self._rate = requests_per_minute / 60.0
+        self._capacity = max(1, burst)
+        self._tokens = float(self._capacity)
+        self._updated = 0.0
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        # Waiters queue on the lock, so tokens are handed out in arrival order.
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                if self._rate <= 0:
+                    return
+                if self._updated:
+                    self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def cool_down(self, seconds: float):
+        """Holds back every caller for `seconds` from now."""
+        until = asyncio.get_running_loop().time() + seconds
+        self._blocked_until = max(self._blocked_until, until)
+
+
+class AdaptiveConcurrencyLimiter:
+    """Caps in-flight requests with an AIMD-tuned limit.
+
+    The limit halves (down to 1) whenever a request comes back overloaded
+    and grows by `increase` after each success, up to `max_limit`. Slots are
+    handed to waiters in arrival order.
+    """
+
+    def __init__(self, max_limit: int, increase: float = 0.5):
+        self._max = max(1, max_limit)
+        self._limit = float(self._max)
+        self._increase = increase
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        if not self._waiters and self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation; pass it on.
+                self._in_flight -= 1
+                self._wake()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self, overloaded: bool | None):
+        """Frees a slot; `overloaded` is None when the outcome says nothing about load."""
+        self._in_flight -= 1
+        if overloaded:
+            self._limit = max(1.0, self._limit / 2)
+            logger.warning("Gemini overloaded; concurrency limit lowered to %d.", int(self._limit))
+        elif overloaded is False:
+            self._limit = min(float(self._max), self._limit + self._increase)
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+
+class GeminiBusyError(RuntimeError):
+    """Raised when a call could not get through the local limits within GEMINI_MAX_QUEUE_WAIT."""
+
+
+class CircuitBreaker:
+    """Fails fast for a model that keeps failing.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    raise CircuitOpenError for `reset_timeout` seconds, so callers fall back
+    right away instead of waiting out the client's retries. Then a single
+    trial call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self._threshold = max(1, failure_threshold)
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+
+    def before_call(self):
+        if self._opened_at is None:
+            return
+        now = asyncio.get_running_loop().time()
+        if self._trial or now - self._opened_at < self._reset_timeout:
+            raise CircuitOpenError(f"Circuit open for model {self.name}.")
+        self._trial = True
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info("Circuit closed for model %s.", self.name)
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self._trial = False
+        self._failures += 1
+        if self._failures >= self._threshold:
+            if self._opened_at is None:
+                logger.warning("Circuit opened for model %s after %d failures.", self.name, self._failures)
+            self._opened_at = asyncio.get_running_loop().time()
+
+    def release(self):
+        """Ends a call whose outcome is unknown, e.g. one that was cancelled."""
+        self._trial = False
+
+
+def is_overloaded(error: Exception) -> bool | None:
+    """Whether the error means the API is shedding load (429, 5xx or a timeout).
+
+    Returns None for errors that say nothing about load, such as a reset connection.
+    """
+    if isinstance(error, (TimeoutError, httpx.TimeoutException)):
+        return True
+    if isinstance(error, genai_errors.APIError):
+        return error.code == 429 or error.code >= 500
+    return None
+
+
+def retry_delay(error: Exception) -> float | None:
+    """Returns the retry delay a 429 response asked for, if it carried one."""
+    if not isinstance(error, genai_errors.APIError) or error.code != 429:
+        return None
+    details = error.details.get("error", {}).get("details", []) if isinstance(error.details, dict) else []
+    for detail in details:
+        if isinstance(detail, dict) and str(detail.get("@type", "")).endswith("RetryInfo"):
+            match = _DURATION.match(str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+gemini_limiter = RateLimiter(GEMINI_RPM, GEMINI_BURST)
+gemini_concurrency = AdaptiveConcurrencyLimiter(GEMINI_CONCURRENCY)
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def _get_breaker(model_name: str) -> CircuitBreaker | None:
+    if GEMINI_BREAKER_FAILURES <= 0:
+        return None
+    breaker = _breakers.get(model_name)
+    if breaker is None:
+        breaker = _breakers[model_name] = CircuitBreaker(model_name, GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET)
+    return breaker
+
+
+@asynccontextmanager
+async def gemini_call(model_name: str) -> AsyncIterator[None]:
+    """Wraps one Gemini request to `model_name`.
+
+    Fails fast while the model's circuit is open, waits up to
+    GEMINI_MAX_QUEUE_WAIT for a concurrency slot and the rate limiter, and
+    records 429 cool-downs.
+    """
+    breaker = _get_breaker(model_name)
+    if breaker:
+        breaker.before_call()
+    has_slot = False
+    overloaded = None
+    try:
+        try:
+            async with asyncio.timeout(GEMINI_MAX_QUEUE_WAIT or None):
+                await gemini_concurrency.acquire()
+                has_slot = True
+                await gemini_limiter.acquire()
+        except TimeoutError:
+            raise GeminiBusyError(f"No Gemini capacity within {GEMINI_MAX_QUEUE_WAIT:g}s.") from None
+        yield
+    except GeminiBusyError:
+        # The model was never called, so its breaker learns nothing.
+        if breaker:
+            breaker.release()
+        raise
+    except Exception as e:
+        overloaded = is_overloaded(e)
+        if breaker:
+            breaker.record_failure()
+        delay = retry_delay(e)
+        if delay:
+            logger.warning("Gemini asked to retry after %.1fs; holding back requests.", delay)
+            gemini_limiter.cool_down(delay)
+        raise
+    except BaseException:
+        if breaker:
+            breaker.release()
+        raise
+    else:
+        overloaded = False
+        if breaker:
+            breaker.record_success()
+    finally:
+        if has_slot:
+            gemini_concurrency.release(overloaded)
@@ -43,7 +43,7 @@ mkdir -p $LOG_DIR
 LOG_FILE="$LOG_DIR/run_$(date +%Y-%m-%d_%H-%M-%S).log"
 
 # --- Build the command ---
-CMD="uvicorn main:app --host 0.0.0.0 --port 8080"
+CMD="uvicorn main:app --host 0.0.0.0 --port 8080 --loop uvloop --http httptools --timeout-keep-alive 30"
 if [ "$DEV_MODE" == true ]; then
     CMD="$CMD --reload"
 fi
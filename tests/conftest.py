@@ -0,0 +1,12 @@
+import os
+import sys
+
+# The app reads its mode and keys at import time, so set them before any test imports it.
+os.environ.setdefault("DEV_MODE", "true")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("SESSION_SECRET_KEY", "test-secret")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Templates, static files and riddles.json are resolved relative to the repo root.
+os.chdir(ROOT)
@@ -0,0 +1,50 @@
+import asyncio
+
+from processors.challenge_generator import ChallengeGeneratorProcessor
+
+_HINT_INPUT = {"riddle": "Sakwe", "answer": "Soma", "story_context": ""}
+
+
+def _generator_with_slow_model(monkeypatch):
+    generator = ChallengeGeneratorProcessor(["gemini-test"])
+    calls = []
+    release = asyncio.Event()
+
+    async def generate_text(prompt, image=None):
+        calls.append(prompt)
+        await release.wait()
+        return "Hint: round|Translation: a thing"
+
+    monkeypatch.setattr(generator, "_generate_text", generate_text)
+    return generator, calls, release
+
+
+def test_identical_prompts_share_one_model_call(monkeypatch):
+    async def scenario():
+        generator, calls, release = _generator_with_slow_model(monkeypatch)
+        first = asyncio.create_task(generator._run_text_processor(_HINT_INPUT, "riddle_hint"))
+        second = asyncio.create_task(generator._run_text_processor(_HINT_INPUT, "riddle_hint"))
+        await asyncio.sleep(0)
+        # One caller going away leaves the call running for the other.
+        first.cancel()
+        release.set()
+        reply = await second
+        return calls, reply, first.cancelled(), generator._inflight
+
+    calls, reply, first_cancelled, inflight = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert reply == "Hint: round|Translation: a thing"
+    assert first_cancelled
+    assert inflight == {}
+
+
+def test_memoized_prompts_are_answered_from_the_cache(monkeypatch):
+    async def scenario():
+        generator, calls, release = _generator_with_slow_model(monkeypatch)
+        release.set()
+        replies = [await generator._run_text_processor(_HINT_INPUT, "riddle_hint") for _ in range(2)]
+        return calls, replies
+
+    calls, replies = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert replies[0] == replies[1]
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+
+import orjson
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+import db_logic
+
+
+class _StubCollection:
+    def __init__(self, name):
+        self.name = name
+        self.indexes = []
+
+    async def create_index(self, key):
+        self.indexes.append(key)
+
+
+class _StubDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, _StubCollection(name))
+
+
+class _StubAdmin:
+    async def command(self, name):
+        return {"ok": 1}
+
+
+class _StubClient:
+    def __init__(self, uri, **options):
+        self.options = options
+        self.admin = _StubAdmin()
+        self.database = _StubDatabase()
+
+    def __getitem__(self, name):
+        return self.database
+
+
+def test_bind_collections_uses_database_collections():
+    database = _StubDatabase()
+    try:
+        db_logic._bind_collections(database)
+        assert db_logic.challenges_collection is database["challenges"]
+        assert db_logic.submissions_collection is database["submissions"]
+        assert db_logic.feedback_collection is database["feedback"]
+    finally:
+        db_logic._bind_collections(None)
+
+
+def test_connect_to_mongo_binds_collections_and_indexes(monkeypatch):
+    monkeypatch.setattr(db_logic, "DEV_MODE", False)
+    monkeypatch.setattr(db_logic.motor.motor_asyncio, "AsyncIOMotorClient", _StubClient)
+    try:
+        asyncio.run(db_logic.connect_to_mongo())
+        database = db_logic.client.database
+        assert db_logic.db is database
+        assert db_logic.challenges_collection is database["challenges"]
+        assert db_logic.submissions_collection is database["submissions"]
+        assert db_logic.feedback_collection is database["feedback"]
+        assert database["submissions"].indexes == ["challenge_id"]
+        assert database["feedback"].indexes == ["challenge_id"]
+    finally:
+        db_logic.client = db_logic.db = None
+        db_logic._bind_collections(None)
+
+
+def test_collections_unavailable_without_database():
+    db_logic._bind_collections(None)
+    try:
+        db_logic.challenges_collection.find_one
+    except RuntimeError as e:
+        assert "Database not initialized" in str(e)
+    else:
+        raise AssertionError("expected the unbound collection to raise")
+
+
+def test_dev_mode_rejects_several_workers(monkeypatch):
+    monkeypatch.setattr(db_logic, "DEV_MODE", db_logic.DEV_MODE)
+    with pytest.raises(ValueError):
+        db_logic.init_app_mode(True, workers=4)
+
+
+class _FlakyCollection:
+    """Fails the first write of the second document, then accepts everything."""
+
+    def __init__(self):
+        self.attempts = []
+
+    async def insert_many(self, documents, ordered):
+        self.attempts.append([document["_id"] for document in documents])
+        if len(self.attempts) == 1:
+            raise BulkWriteError({"nInserted": 1, "writeErrors": [{"index": 1, "code": 91, "errmsg": "shutting down"}]})
+
+
+def test_save_submissions_retries_only_the_failed_documents(monkeypatch):
+    collection = _FlakyCollection()
+    monkeypatch.setattr(db_logic, "DEV_MODE", False)
+    monkeypatch.setattr(db_logic, "SUBMISSION_RETRY_DELAY", 0)
+    monkeypatch.setattr(db_logic, "submissions_collection", collection)
+    submissions = [db_logic.Submission(challenge_id=ObjectId(), user_answer=answer) for answer in ("a", "b")]
+
+    inserted_ids = asyncio.run(db_logic.save_submissions(submissions))
+
+    assert collection.attempts == [inserted_ids, inserted_ids[1:]]
+
+
+class _RecordingCollection:
+    def __init__(self):
+        self.batches = []
+
+    async def insert_many(self, documents, ordered):
+        self.batches.append([document["user_answer"] for document in documents])
+
+
+def test_stopping_the_writer_flushes_queued_submissions(monkeypatch):
+    collection = _RecordingCollection()
+    monkeypatch.setattr(db_logic, "DEV_MODE", False)
+    monkeypatch.setattr(db_logic, "submissions_collection", collection)
+
+    async def scenario():
+        db_logic.start_background_writers()
+        for answer in ("a", "b", "c"):
+            db_logic.enqueue_submission(db_logic.Submission(challenge_id=ObjectId(), user_answer=answer))
+        await db_logic.stop_background_writers()
+
+    asyncio.run(scenario())
+    assert collection.batches == [["a", "b", "c"]]
+    assert db_logic._submission_writer is None
+
+
+def test_stopping_the_dev_flusher_waits_for_the_write_in_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_logic, "DEV_DB_FILE", str(tmp_path / "dev_db.json"))
+    monkeypatch.setattr(db_logic, "DEV_DB_FLUSH_DELAY", 0)
+    monkeypatch.setattr(db_logic, "DEV_MODE", True)
+    monkeypatch.setattr(db_logic, "_dev_cache", {"challenges": [], "submissions": []})
+    writing = threading.Lock()
+    overlapped = []
+    write_file = db_logic._write_dev_db_file
+
+    def slow_write(contents):
+        if not writing.acquire(blocking=False):
+            overlapped.append(contents)
+            return
+        try:
+            time.sleep(0.05)
+            write_file(contents)
+        finally:
+            writing.release()
+
+    monkeypatch.setattr(db_logic, "_write_dev_db_file", slow_write)
+
+    async def scenario():
+        db_logic.start_background_writers()
+        db_logic._write_dev_db({"challenges": ["first"], "submissions": []})
+        # Let the flusher start writing, then change the data and stop mid-write.
+        await asyncio.sleep(0.02)
+        db_logic._write_dev_db({"challenges": ["second"], "submissions": []})
+        await db_logic.stop_background_writers()
+
+    asyncio.run(scenario())
+    assert overlapped == []
+    with open(db_logic.DEV_DB_FILE, "rb") as f:
+        assert orjson.loads(f.read())["challenges"] == ["second"]
+    assert db_logic._dev_flusher is None
@@ -0,0 +1,25 @@
+import asyncio
+
+import httpx
+from genai_processors.core import genai_model
+from google.genai import types as genai_types
+
+from processors import gemini_models
+
+
+def test_warm_up_uses_the_pool_the_models_share(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"name": "models/gemini-test"})
+
+    options = genai_types.HttpOptions(httpx_async_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(gemini_models, "http_options", lambda: options)
+
+    asyncio.run(gemini_models.warm_up("test-key", "gemini-test", timeout=5))
+
+    assert len(requests) == 1
+    assert requests[0].url.path.endswith("/models/gemini-test")
+    model = genai_model.GenaiModel(model_name="gemini-test", api_key="test-key", http_options=gemini_models.http_options())
+    assert model._client._api_client._async_httpx_client is options.httpx_async_client
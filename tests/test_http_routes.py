@@ -0,0 +1,74 @@
+import asyncio
+
+from fastapi import WebSocketDisconnect
+
+import context
+from api import http_routes
+
+
+class _FakeSocket:
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def receive_bytes(self):
+        frame = self.frames.pop(0)
+        if isinstance(frame, BaseException):
+            raise frame
+        return frame
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def close(self, code=1000, reason=None):
+        self.closed = True
+
+
+class _AudioPart:
+    def __init__(self, audio):
+        self.audio = audio
+
+
+class _Transcript:
+    def __init__(self, text):
+        self.text = text
+
+
+async def _fake_stt(stream):
+    async for part in stream:
+        yield _Transcript(f"heard {len(part.audio)}")
+
+
+def _run_transcription(monkeypatch, frames):
+    monkeypatch.setattr(context, "stt_processor", _fake_stt)
+    monkeypatch.setattr(http_routes, "ProcessorPart", _AudioPart)
+    socket = _FakeSocket(frames)
+    asyncio.run(asyncio.wait_for(http_routes.websocket_endpoint(socket), 5))
+    return socket
+
+
+def test_transcription_ends_on_disconnect(monkeypatch):
+    socket = _run_transcription(monkeypatch, [b"abc", b"defgh", WebSocketDisconnect()])
+    assert socket.sent == ["heard 3", "heard 5"]
+    assert socket.closed
+
+
+def test_transcription_ends_on_receive_error(monkeypatch):
+    # A text frame makes receive_bytes() raise KeyError.
+    socket = _run_transcription(monkeypatch, [b"abc", KeyError("bytes"), WebSocketDisconnect()])
+    assert socket.sent == ["heard 3"]
+    assert socket.closed
+
+
+def test_audio_buffer_close_does_not_wait_for_space():
+    async def scenario():
+        buffer = http_routes._AudioBuffer(1)
+        await buffer.put(b"a")
+        buffer.close()
+        return [await buffer.get(), await buffer.get()]
+
+    assert asyncio.run(scenario()) == [b"a", None]
@@ -0,0 +1,65 @@
+import asyncio
+
+from genai_processors import processor
+from genai_processors.content_api import ProcessorPart
+
+from processors.game_logic.sakwe_processor import GameState, SakweProcessor
+
+
+class _Clip:
+    """Stands in for an audio part; the text is the "audio"."""
+
+    def __init__(self, audio):
+        self.audio = audio
+
+
+class _EchoSTT(processor.Processor):
+    """Transcribes each clip as the text it was made from."""
+
+    async def call(self, content):
+        async for part in content:
+            yield ProcessorPart(part.bytes.decode())
+
+
+async def _echo_tts(stream):
+    async for part in stream:
+        yield _Clip(part.text)
+
+
+def _play(*utterances):
+    sakwe = SakweProcessor(_EchoSTT(), _echo_tts)
+    sakwe.riddles = ({"riddle": "Nyirabarazana", "answer": "Inka"},)
+
+    async def clips():
+        for text in utterances:
+            yield _Clip(text.encode())
+
+    async def scenario():
+        return [part.audio async for part in sakwe.call(clips())]
+
+    return sakwe, asyncio.run(scenario())
+
+
+def test_answer_pattern_matches_any_keyword():
+    pattern = SakweProcessor._compile_answer_pattern("Inka n'ihene")
+    assert pattern.search("ni INKA")
+    assert not pattern.search("ni intama")
+    assert SakweProcessor._compile_answer_pattern("?!") is None
+
+
+def test_answer_pattern_ignores_punctuation_in_the_answer():
+    assert SakweProcessor._compile_answer_pattern("Inka!").pattern == "inka"
+
+
+def test_call_plays_a_round_from_sakwe_to_a_correct_answer():
+    sakwe, spoken = _play("sakwe sakwe", "soma", "ni intama", "ni inka")
+    assert spoken[:2] == ["Soma!", "Nyirabarazana"]
+    assert spoken[2].startswith("That's not quite right.")
+    assert spoken[3] == "Correct!"
+    assert sakwe.state is GameState.WAITING_FOR_SAKWE
+
+
+def test_call_reveals_the_answer_after_three_misses():
+    sakwe, spoken = _play("sakwe", "soma", "oya", "oya", "oya")
+    assert spoken[-1] == "The correct answer is Inka. Let's try another one."
+    assert sakwe.state is GameState.WAITING_FOR_SAKWE
@@ -0,0 +1,86 @@
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from genai_processors.content_api import ProcessorPart
+
+import context
+import db_logic
+from processors.challenge_generator import ChallengeGeneratorProcessor
+
+_REPLIES = {
+    "story_creation": orjson.dumps({"title": "Isoko", "chapters": ["At the market.", "In the park.", "By the lake."]}).decode(),
+    "story_translation": "Hello friend|Muraho inshuti",
+    "instruction_generation": "Translate this!",
+    "riddle_hint": "Hint: it is round|Translation: a thing",
+}
+
+
+async def _fake_text(self, processor_input, prompt_key):
+    return _REPLIES[prompt_key]
+
+
+async def _no_warm_up(self, timeout):
+    pass
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_logic, "DEV_DB_FILE", str(tmp_path / "dev_db.json"))
+    monkeypatch.setattr(db_logic, "_dev_cache", None)
+    db_logic._init_dev_db()
+    monkeypatch.setattr(ChallengeGeneratorProcessor, "_run_text_processor", _fake_text)
+    monkeypatch.setattr(ChallengeGeneratorProcessor, "warm_up", _no_warm_up)
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def test_story_challenge_and_answers(client):
+    response = client.get("/get_challenge?game_mode=story")
+    assert response.status_code == 200
+    challenge = response.json()
+    assert challenge["challenge_type"] == "story_translation"
+    assert challenge["source_text"] == "Hello friend"
+
+    response = client.post("/submit_answer", data={"challenge_id": challenge["challenge_id"], "user_answer": "Muraho inshuti"})
+    assert response.status_code == 200
+    assert response.json()["is_correct"] is True
+
+    response = client.post("/submit_answer", data={"challenge_id": challenge["challenge_id"], "user_answer": "Oya"})
+    assert response.status_code == 200
+    assert response.json()["is_correct"] is False
+
+
+def test_sakwe_then_soma(client):
+    response = client.get("/get_challenge?game_mode=sakwe")
+    assert response.status_code == 200
+    assert response.json()["challenge_type"] == "gusakuza_init"
+
+    response = client.post("/soma")
+    assert response.status_code == 200
+    assert response.json()["challenge_type"] == "gusakuza"
+
+
+def test_soma_without_pending_riddle(client):
+    assert client.post("/soma").status_code == 400
+
+
+async def _unparseable_game_processor(stream):
+    async for _ in stream:
+        pass
+    yield ProcessorPart("not json")
+
+
+def test_image_fallback_uses_the_loaded_sample_images(client, monkeypatch):
+    monkeypatch.setattr(context, "game_processor", _unparseable_game_processor)
+    monkeypatch.setattr(context.challenge_generator, "image_files", ("sample.png",))
+    response = client.get("/get_challenge?game_mode=image")
+    assert response.status_code == 200
+    assert response.json()["source_text"] == "/static/sampleimg/sample.png"
+
+
+def test_image_fallback_without_sample_images(client, monkeypatch):
+    monkeypatch.setattr(context, "game_processor", _unparseable_game_processor)
+    monkeypatch.setattr(context.challenge_generator, "image_files", ())
+    assert client.get("/get_challenge?game_mode=image").status_code == 503
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from processors import throttling
+
+
+def test_gemini_call_gives_up_after_max_queue_wait(monkeypatch):
+    monkeypatch.setattr(throttling, "GEMINI_MAX_QUEUE_WAIT", 0.05)
+    monkeypatch.setattr(throttling, "gemini_limiter", throttling.RateLimiter(60, 1))
+    monkeypatch.setattr(throttling, "gemini_concurrency", throttling.AdaptiveConcurrencyLimiter(4))
+    monkeypatch.setattr(throttling, "_breakers", {})
+
+    async def scenario():
+        async with throttling.gemini_call("gemini-test"):
+            pass
+        # The bucket is empty and refills in a second, well past the queue wait.
+        with pytest.raises(throttling.GeminiBusyError):
+            async with throttling.gemini_call("gemini-test"):
+                pass
+
+    asyncio.run(scenario())
+    assert throttling._breakers["gemini-test"]._failures == 0
+
+
+def test_only_load_related_errors_count_as_overload():
+    assert throttling.is_overloaded(throttling.genai_errors.APIError(503, {})) is True
+    assert throttling.is_overloaded(throttling.genai_errors.APIError(400, {})) is False
+    assert throttling.is_overloaded(throttling.httpx.ReadTimeout("slow")) is True
+    assert throttling.is_overloaded(ConnectionResetError()) is None
+
+
+def test_unrelated_errors_leave_the_concurrency_limit_alone(monkeypatch):
+    limiter = throttling.AdaptiveConcurrencyLimiter(4)
+    limiter._limit = 2.0
+    monkeypatch.setattr(throttling, "gemini_concurrency", limiter)
+    monkeypatch.setattr(throttling, "gemini_limiter", throttling.RateLimiter(0, 1))
+    monkeypatch.setattr(throttling, "_breakers", {})
+
+    async def scenario():
+        with pytest.raises(ConnectionResetError):
+            async with throttling.gemini_call("gemini-test"):
+                raise ConnectionResetError()
+
+    asyncio.run(scenario())
+    assert limiter._limit == 2.0
+
+
+def test_concurrency_limiter_hands_out_slots_in_arrival_order():
+    async def scenario():
+        limiter = throttling.AdaptiveConcurrencyLimiter(1)
+        await limiter.acquire()
+        order = []
+
+        async def wait(name):
+            await limiter.acquire()
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("a", "b", "c")]
+        await asyncio.sleep(0)
+        for _ in waiters:
+            limiter.release(None)
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(scenario()) == ["a", "b", "c"]
+
+
+def test_concurrency_limiter_passes_on_a_slot_handed_to_a_cancelled_waiter():
+    async def scenario():
+        limiter = throttling.AdaptiveConcurrencyLimiter(1)
+        await limiter.acquire()
+        first = asyncio.create_task(limiter.acquire())
+        second = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # The slot goes to `first`, which is cancelled before it gets to run.
+        limiter.release(None)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, 1)
+        return limiter._in_flight
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_concurrency_limiter_backs_off_and_recovers():
+    limiter = throttling.AdaptiveConcurrencyLimiter(4, increase=1)
+    limiter._in_flight = 2
+    limiter.release(True)
+    assert limiter._limit == 2
+    limiter.release(False)
+    assert limiter._limit == 3
+
+
+def test_rate_limiter_spaces_requests_past_the_burst():
+    async def scenario():
+        limiter = throttling.RateLimiter(600, 1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await limiter.acquire()
+        first = loop.time() - start
+        await limiter.acquire()
+        return first, loop.time() - start
+
+    first, second = asyncio.run(scenario())
+    # 600 requests per minute is one token every 0.1s.
+    assert first < 0.05
+    assert 0.09 <= second < 0.5
+
+
+def test_rate_limiter_honors_cool_down():
+    async def scenario():
+        limiter = throttling.RateLimiter(0, 1)
+        loop = asyncio.get_running_loop()
+        limiter.cool_down(0.1)
+        start = loop.time()
+        await limiter.acquire()
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_circuit_breaker_opens_lets_one_trial_through_and_closes():
+    async def scenario():
+        breaker = throttling.CircuitBreaker("gemini-test", failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with pytest.raises(throttling.CircuitOpenError):
+            breaker.before_call()
+
+        await asyncio.sleep(0.06)
+        breaker.before_call()
+        # Only one trial call at a time.
+        with pytest.raises(throttling.CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+
+    asyncio.run(scenario())
+
+
+def test_circuit_breaker_reopens_when_the_trial_fails():
+    async def scenario():
+        breaker = throttling.CircuitBreaker("gemini-test", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        await asyncio.sleep(0.06)
+        breaker.before_call()
+        breaker.record_failure()
+        with pytest.raises(throttling.CircuitOpenError):
+            breaker.before_call()
+
+    asyncio.run(scenario())